@@ -0,0 +1,8 @@
+-- Индексы под выборку вопросов в quiz._query_question_ids:
+-- is_active = true + (опционально) topic_id или difficulty.
+-- CONCURRENTLY не блокирует запись, поэтому выполняйте каждый запрос отдельно (вне транзакции).
+create index concurrently if not exists idx_questions_active_topic
+  on public.questions(topic_id, id) where is_active;
+
+create index concurrently if not exists idx_questions_active_difficulty
+  on public.questions(difficulty, id) where is_active;
@@ -0,0 +1,190 @@
+-- SQL-функции, которые бот вызывает через RPC: ответы, /start, статистика, платежи, админка.
+-- Применяйте после создания user_settings/user_day (см. README). Скрипт идемпотентен.
+
+-- Возвращаемый тип менялся (раньше возвращалась строка user_settings), поэтому пересоздаём.
+drop function if exists public.bootstrap_user(bigint, text, text);
+
+create or replace function public.bootstrap_user(p_tg bigint, p_first_name text, p_username text)
+returns void
+language sql
+as $$
+  insert into public.users (tg_id, first_name, username)
+  values (p_tg, p_first_name, p_username)
+  on conflict (tg_id) do update
+    set first_name = excluded.first_name,
+        username = excluded.username;
+  insert into public.user_settings (tg_id) values (p_tg) on conflict (tg_id) do nothing;
+$$;
+
+create or replace function public.increment_paid_packs(p_tg bigint, p_delta integer)
+returns integer
+language sql
+as $$
+  insert into public.user_settings (tg_id, paid_packs_available)
+  values (p_tg, p_delta)
+  on conflict (tg_id) do update
+    set paid_packs_available = public.user_settings.paid_packs_available + p_delta,
+        updated_at = now()
+  returning paid_packs_available;
+$$;
+
+create or replace function public.extend_unlimited(p_tg bigint, p_days integer)
+returns timestamptz
+language sql
+as $$
+  insert into public.subscriptions (tg_id, unlimited_until)
+  values (p_tg, now() + make_interval(days => p_days))
+  on conflict (tg_id) do update
+    set unlimited_until = greatest(public.subscriptions.unlimited_until, now()) + make_interval(days => p_days)
+  returning unlimited_until;
+$$;
+
+create or replace function public.insert_payment_if_new(
+  p_tg bigint,
+  p_currency text,
+  p_total_amount integer,
+  p_invoice_payload text,
+  p_charge_id text
+)
+returns boolean
+language sql
+as $$
+  with inserted as (
+    insert into public.payments (tg_id, provider, currency, total_amount, invoice_payload, telegram_payment_charge_id)
+    values (p_tg, 'telegram_stars', p_currency, p_total_amount, p_invoice_payload, p_charge_id)
+    on conflict (telegram_payment_charge_id) do nothing
+    returning 1
+  )
+  select exists (select 1 from inserted);
+$$;
+
+create or replace function public.toggle_question(qid bigint)
+returns boolean
+language sql
+as $$
+  update public.questions set is_active = not is_active where id = qid returning is_active;
+$$;
+
+create or replace function public.record_answer(
+  p_tg_id bigint,
+  p_question_id bigint,
+  p_chosen integer,
+  p_is_correct boolean,
+  p_day date,
+  p_answered_at timestamptz
+)
+returns json
+language plpgsql
+as $$
+declare
+  v_until timestamptz;
+  v_unlimited boolean;
+  v_day public.user_day;
+begin
+  insert into public.answers (tg_id, day, question_id, chosen, is_correct, answered_at)
+  values (p_tg_id, p_day, p_question_id, p_chosen, p_is_correct, p_answered_at);
+
+  select max(unlimited_until) into v_until from public.subscriptions where tg_id = p_tg_id;
+  v_unlimited := coalesce(v_until > now(), false);
+
+  insert into public.user_day as d (tg_id, day, correct_count, wrong_count, streak_today, is_blocked)
+  values (
+    p_tg_id,
+    p_day,
+    case when p_is_correct then 1 else 0 end,
+    case when p_is_correct then 0 else 1 end,
+    case when p_is_correct then 1 else 0 end,
+    not p_is_correct and not v_unlimited
+  )
+  on conflict (tg_id, day) do update
+    set correct_count = d.correct_count + case when p_is_correct then 1 else 0 end,
+        wrong_count = d.wrong_count + case when p_is_correct then 0 else 1 end,
+        streak_today = case
+          when p_is_correct then d.streak_today + 1
+          when v_unlimited then d.streak_today
+          else 0
+        end,
+        is_blocked = d.is_blocked or (not p_is_correct and not v_unlimited)
+  returning * into v_day;
+
+  update public.users
+    set total_answers = total_answers + 1,
+        total_correct = total_correct + case when p_is_correct then 1 else 0 end,
+        total_wrong = total_wrong + case when p_is_correct then 0 else 1 end,
+        best_streak = greatest(best_streak, v_day.streak_today)
+  where tg_id = p_tg_id;
+
+  return json_build_object(
+    'correct_count', v_day.correct_count,
+    'streak_today', v_day.streak_today,
+    'is_blocked', v_day.is_blocked,
+    'unlimited', v_unlimited,
+    'unlimited_until', v_until
+  );
+end;
+$$;
+
+create or replace function public.user_rank(p_tg_id bigint, p_metric text)
+returns integer
+language plpgsql
+stable
+as $$
+declare
+  v_value integer;
+  v_rank integer;
+begin
+  if p_metric not in ('total_correct', 'best_streak') then
+    raise exception 'Unsupported leaderboard metric: %', p_metric;
+  end if;
+  execute format('select coalesce((select %I from public.users where tg_id = $1), 0)', p_metric)
+    into v_value using p_tg_id;
+  execute format('select count(*) + 1 from public.users where %1$I > $2 or (%1$I = $2 and tg_id < $1)', p_metric)
+    into v_rank using p_tg_id, v_value;
+  return v_rank;
+end;
+$$;
+
+create or replace function public.user_profile(p_tg_id bigint, p_day date)
+returns json
+language plpgsql
+as $$
+begin
+  insert into public.user_day (tg_id, day) values (p_tg_id, p_day) on conflict (tg_id, day) do nothing;
+  return (
+    select json_build_object(
+      'total_answers', u.total_answers,
+      'total_correct', u.total_correct,
+      'total_wrong', u.total_wrong,
+      'best_streak', u.best_streak,
+      'streak_today', d.streak_today,
+      'correct_today', d.correct_count,
+      'unlimited_until', s.unlimited_until
+    )
+    from public.users u
+    join public.user_day d on d.tg_id = u.tg_id and d.day = p_day
+    left join public.subscriptions s on s.tg_id = u.tg_id
+    where u.tg_id = p_tg_id
+  );
+end;
+$$;
+
+create or replace function public.admin_stats()
+returns json
+language sql
+stable
+as $$
+  select json_build_object(
+    'total_users', (select count(*) from public.users),
+    'total_answers', (select count(*) from public.answers),
+    'active_unlimited', (select count(*) from public.subscriptions where unlimited_until > now())
+  );
+$$;
+
+-- Версия схемы, которую бот проверяет при старте (Database.check_schema_version).
+create or replace function public.bot_schema_version()
+returns integer
+language sql
+immutable
+as $$
+  select 4;
+$$;
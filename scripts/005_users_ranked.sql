@@ -0,0 +1,46 @@
+-- Материализованный рейтинг для rating.user_rank; обновляется ботом раз в минуту через refresh_users_ranked().
+-- Применяйте после 004_functions.sql тем же пользователем, что создаёт таблицы (владельцем представления).
+
+create materialized view if not exists public.users_ranked as
+  select
+    tg_id,
+    rank() over (order by total_correct desc, tg_id) as rank_correct,
+    rank() over (order by best_streak desc, tg_id) as rank_streak
+  from public.users;
+
+create unique index if not exists users_ranked_tg_id_idx on public.users_ranked (tg_id);
+
+-- Представление без RLS в схеме public: читать его может только service_role.
+revoke all on public.users_ranked from anon, authenticated;
+grant select on public.users_ranked to service_role;
+
+-- REFRESH требует владения представлением, поэтому функция выполняется с правами владельца.
+create or replace function public.refresh_users_ranked()
+returns void
+language sql
+security definer
+set search_path = ''
+as $$
+  refresh materialized view concurrently public.users_ranked;
+$$;
+
+do $$
+begin
+  execute format(
+    'alter function public.refresh_users_ranked() owner to %I',
+    (select matviewowner from pg_catalog.pg_matviews where schemaname = 'public' and matviewname = 'users_ranked')
+  );
+end;
+$$;
+
+revoke execute on function public.refresh_users_ranked() from public, anon, authenticated;
+grant execute on function public.refresh_users_ranked() to service_role;
+
+-- Версия схемы, которую бот проверяет при старте (Database.check_schema_version).
+create or replace function public.bot_schema_version()
+returns integer
+language sql
+immutable
+as $$
+  select 5;
+$$;
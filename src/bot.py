@@ -4,23 +4,32 @@ import asyncio
 import csv
 import io
 import logging
+import time
+from collections.abc import Callable
 from datetime import datetime, timezone
+from typing import Any
 
+import orjson
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.enums import ParseMode
-from aiogram.filters import Command
+from aiogram.filters import BaseFilter, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Document, LabeledPrice, Message, PreCheckoutQuery
 from postgrest.exceptions import APIError
 
+try:
+    import uvloop
+except ImportError:  # uvloop has no Windows build; fall back to the stock asyncio loop
+    uvloop = None
+
 from src.config import settings
-from src.db import db
+from src.db import QUESTIONS_INSERT_CHUNK_SIZE, db
 from src.logic import admin as admin_logic
 from src.logic import entitlements, payments, quiz, rating
-from src.logic.bulk_import import parse_bulk_block as _parse_bulk_block
-from src.logic.bulk_import import split_bulk_blocks as _split_bulk_blocks
+from src.logic.bulk_import import parse_bulk_blocks as _parse_bulk_blocks
 from src.ui.keyboards import (
     admin_menu_kb,
     answers_kb,
@@ -37,10 +46,16 @@ logger = logging.getLogger(__name__)
 
 bot = Bot(
     token=settings.telegram_bot_token,
+    session=AiohttpSession(json_loads=orjson.loads, json_dumps=lambda obj: orjson.dumps(obj).decode()),
     default=DefaultBotProperties(parse_mode=ParseMode.HTML),
 )
 dp = Dispatcher()
 
+MONETIZATION_ENABLED = settings.monetization_enabled
+TEST_MODE = settings.test_mode
+PACK10_STARS = settings.pack10_stars
+UNLIMITED30_STARS = settings.unlimited30_stars
+
 
 class AddQuestionFSM(StatesGroup):
     text = State()
@@ -68,15 +83,37 @@ class UnlimitedFSM(StatesGroup):
     difficulty = State()
 
 
-def can_use_test_commands(tg_id: int) -> bool:
-    return settings.test_mode and admin_logic.has_test_mode_access(tg_id)
+class CallbackPrefix(BaseFilter):
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+
+    async def __call__(self, callback: CallbackQuery) -> bool:
+        return callback.data is not None and callback.data.startswith(self.prefix)
+
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+UTC_DATETIME_FORMAT = f"{DATETIME_FORMAT} UTC"
+_UTC = timezone.utc
+
+
+def _format_utc(value: datetime) -> str:
+    return value.astimezone(_UTC).strftime(UTC_DATETIME_FORMAT)
+
+
+async def _db(call: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    return await asyncio.to_thread(call, *args, **kwargs)
+
+
+async def can_use_test_commands(tg_id: int) -> bool:
+    return TEST_MODE and await _db(admin_logic.has_test_mode_access, tg_id)
 
 
 async def process_test_payment(message: Message, payload: str, amount: int) -> None:
     tg_id = message.from_user.id
-    charge_id = f"TEST-{tg_id}-{payload}-{int(datetime.now(timezone.utc).timestamp())}"
+    charge_id = f"TEST-{tg_id}-{payload}-{int(time.time())}"
 
-    result = entitlements.grant_purchase(
+    result = await _db(
+        entitlements.grant_purchase,
         tg_id=tg_id,
         payload=payload,
         amount=amount,
@@ -91,24 +128,24 @@ async def process_test_payment(message: Message, payload: str, amount: int) -> N
     if payload == payments.PACK10_PAYLOAD:
         await message.answer(
             "🧪 TEST MODE: начислено +10 вопросов.",
-            reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(tg_id)),
+            reply_markup=start_kb(has_unlimited=await _db(quiz.has_unlimited_now, tg_id)),
         )
         return
 
-    until = datetime.fromisoformat(result["new_until"])
-    until_local = until.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    until_local = _format_utc(datetime.fromisoformat(result["new_until"]))
     await message.answer(
         f"🧪 TEST MODE: начислен безлимит до {until_local}.",
         reply_markup=start_kb(has_unlimited=True),
     )
 
 
-async def send_next_question(message: Message, tg_id: int) -> None:
-    question = quiz.pick_question(tg_id)
+async def send_next_question(message: Message, tg_id: int, prefix: str | None = None) -> None:
+    question = await _db(quiz.pick_question, tg_id)
     if not question:
-        await message.answer(NO_QUESTIONS)
+        await message.answer(f"{prefix}\n\n{NO_QUESTIONS}" if prefix else NO_QUESTIONS)
         return
-    await message.answer(question_text(question), reply_markup=answers_kb(question["id"]))
+    text = question_text(question)
+    await message.answer(f"{prefix}\n\n{text}" if prefix else text, reply_markup=answers_kb(question["id"]))
 
 def _bulk_import_report(ok_count: int, duplicate_count: int, errors: list[str]) -> str:
     lines = [f"Импорт: добавлено {ok_count}, дубликатов {duplicate_count}, ошибок {len(errors)}"]
@@ -188,6 +225,7 @@ def _topic_id_by_name(topic_name: str, cache: dict[str, int]) -> int:
     created = db.client.table("topics").insert({"title": normalized, "is_active": True}).execute().data or []
     if not created:
         raise ValueError("не удалось создать topic")
+    _invalidate_topics_listing()
     topic_id = int(created[0]["id"])
     cache[normalized.lower()] = topic_id
     logger.info("Создана новая тема при импорте CSV: id=%s title=%s", topic_id, normalized)
@@ -248,7 +286,15 @@ def _build_question_from_csv_row(row: dict, row_number: int, topic_cache: dict[s
     return payload
 
 
-def _iter_chunks(items: list[dict], chunk_size: int = 100):
+def _toggle_question(qid: int) -> bool | None:
+    # Flips is_active in one UPDATE ... RETURNING; None means there is no such question.
+    is_active = db.client.rpc("toggle_question", {"qid": qid}).execute().data
+    if is_active is not None:
+        quiz.bust_questions_cache()
+    return is_active
+
+
+def _iter_chunks(items: list, chunk_size: int = 100):
     for i in range(0, len(items), chunk_size):
         yield items[i : i + chunk_size]
 
@@ -282,23 +328,41 @@ def _parse_csv_questions(csv_text: str) -> tuple[list[dict], list[str]]:
     return questions, errors
 
 
+def _insert_questions_one_by_one(rows: list[dict], errors: list[str], text_key: str) -> tuple[int, int]:
+    inserted = 0
+    duplicates = 0
+    for payload in rows:
+        try:
+            db.client.table("questions").insert(payload).execute()
+            inserted += 1
+        except Exception as exc:
+            if _is_duplicate_q_hash_error(exc):
+                duplicates += 1
+                continue
+            errors.append(f"Вставка '{payload.get(text_key, '')[:80]}': {exc}")
+    return inserted, duplicates
+
+
+def _insert_questions_chunk(rows: list[dict], errors: list[str], text_key: str) -> tuple[int, int]:
+    if not rows:
+        return 0, 0
+    try:
+        inserted, duplicates = db.insert_questions_bulk(rows), 0
+    except Exception:
+        logger.warning("Пакетная вставка вопросов не удалась, вставляю по одному", exc_info=True)
+        inserted, duplicates = _insert_questions_one_by_one(rows, errors, text_key)
+    if inserted:
+        quiz.bust_questions_cache()
+    return inserted, duplicates
+
+
 def _bulk_insert_questions(payloads: list[dict], errors: list[str]) -> tuple[int, int]:
     inserted = 0
     duplicates = 0
     for chunk in _iter_chunks(payloads, chunk_size=100):
-        chunk_inserted = 0
-        chunk_duplicates = 0
-        for payload in chunk:
-            try:
-                db.client.table("questions").insert(payload).execute()
-                inserted += 1
-                chunk_inserted += 1
-            except Exception as exc:
-                if _is_duplicate_q_hash_error(exc):
-                    duplicates += 1
-                    chunk_duplicates += 1
-                    continue
-                errors.append(f"Вставка '{payload.get('text', '')[:80]}': {exc}")
+        chunk_inserted, chunk_duplicates = _insert_questions_chunk(chunk, errors, "text")
+        inserted += chunk_inserted
+        duplicates += chunk_duplicates
         logger.info(
             "Импорт CSV: обработан чанк size=%s inserted=%s duplicates=%s",
             len(chunk),
@@ -308,6 +372,40 @@ def _bulk_insert_questions(payloads: list[dict], errors: list[str]) -> tuple[int
     return inserted, duplicates
 
 
+TOPICS_LISTING_TTL_SECONDS = 30.0
+
+_topics_listing_cache: tuple[float, str] | None = None
+
+
+def _active_topics_listing() -> str:
+    global _topics_listing_cache
+    now = time.monotonic()
+    if _topics_listing_cache is not None and now - _topics_listing_cache[0] < TOPICS_LISTING_TTL_SECONDS:
+        return _topics_listing_cache[1]
+
+    rows = db.client.table("topics").select("id,title").eq("is_active", True).order("id").limit(100).execute().data or []
+    listing = "\n".join(f"{row['id']}: {row['title']}" for row in rows)
+    _topics_listing_cache = (now, listing)
+    return listing
+
+
+def _invalidate_topics_listing() -> None:
+    global _topics_listing_cache
+    _topics_listing_cache = None
+
+
+def _insert_bulk_payloads(payloads: list[dict], errors: list[str]) -> tuple[int, int]:
+    # Duplicates are left to the q_hash unique index: a chunk that hits it falls back to
+    # one-by-one inserts, which count the conflicting rows as duplicates.
+    inserted = 0
+    duplicates = 0
+    for chunk in _iter_chunks(payloads, chunk_size=QUESTIONS_INSERT_CHUNK_SIZE):
+        chunk_inserted, chunk_duplicates = _insert_questions_chunk(chunk, errors, "q")
+        inserted += chunk_inserted
+        duplicates += chunk_duplicates
+    return inserted, duplicates
+
+
 def _stats_message(st: dict) -> str:
     until = st["unlimited_until"].isoformat() if st["unlimited_until"] else "нет"
     progress_today = "безлимит" if st["unlimited_until"] else f"{st['correct_today']}/{quiz.DAILY_LIMIT}"
@@ -327,32 +425,35 @@ def _stats_message(st: dict) -> str:
 async def cmd_start(message: Message) -> None:
     user = message.from_user
     tg_id = user.id
-    db.upsert_user(tg_id, user.first_name, user.username)
-    db.ensure_user_settings(tg_id)
-    quiz.ensure_day_row(tg_id)
+    await _db(db.bootstrap_user, tg_id, user.first_name, user.username)
 
-    allowed, reason = quiz.can_start_quiz_now(tg_id)
+    has_unlimited = await _db(quiz.has_unlimited_now, tg_id)
+    allowed, reason = await _db(quiz.can_start_quiz_now, tg_id, has_unlimited=has_unlimited)
     if not allowed:
-        await message.answer(f"{WELCOME}\n\n{reason}", reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(tg_id)))
+        await message.answer(f"{WELCOME}\n\n{reason}", reply_markup=start_kb(has_unlimited=has_unlimited))
         return
 
     quiz.reset_session(tg_id)
-    await message.answer(WELCOME, reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(tg_id)))
+    await message.answer(WELCOME, reply_markup=start_kb(has_unlimited=has_unlimited))
     await send_next_question(message, tg_id)
 
 
 @dp.message(F.text == "Начать")
 async def begin_quiz(message: Message) -> None:
     tg_id = message.from_user.id
-    allowed, reason = quiz.can_start_quiz_now(tg_id)
+    has_unlimited = await _db(quiz.has_unlimited_now, tg_id)
+    allowed, reason = await _db(quiz.can_start_quiz_now, tg_id, has_unlimited=has_unlimited)
     if not allowed:
-        await message.answer(reason or BLOCKED, reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(tg_id)))
+        await message.answer(reason or BLOCKED, reply_markup=start_kb(has_unlimited=has_unlimited))
         return
     quiz.reset_session(tg_id)
     await send_next_question(message, tg_id)
 
 
-@dp.callback_query(F.data.startswith("ans:"))
+_answers_in_flight: set[tuple[int, int]] = set()
+
+
+@dp.callback_query(CallbackPrefix("ans:"))
 async def answer_handler(callback: CallbackQuery) -> None:
     raw_data = callback.data or ""
     logger.info("Received answer callback: user_id=%s data=%s", callback.from_user.id, raw_data)
@@ -379,13 +480,26 @@ async def answer_handler(callback: CallbackQuery) -> None:
     logger.info("Parsed answer callback: user_id=%s question_id=%s answer=%s", callback.from_user.id, qid, answer)
     tg_id = callback.from_user.id
 
-    question = quiz.get_question_by_id(qid)
+    # Double taps on the same answer button must not race through save_answer.
+    in_flight_key = (tg_id, qid)
+    if in_flight_key in _answers_in_flight:
+        await callback.answer("Ответ обрабатывается")
+        return
+    _answers_in_flight.add(in_flight_key)
+    try:
+        await _process_answer(callback, tg_id, qid, answer)
+    finally:
+        _answers_in_flight.discard(in_flight_key)
+
+
+async def _process_answer(callback: CallbackQuery, tg_id: int, qid: int, answer: int) -> None:
+    question = await _db(quiz.get_question_by_id, qid)
     if not question:
         logger.warning("Question not found for callback: user_id=%s question_id=%s", tg_id, qid)
         await callback.answer("Вопрос не найден", show_alert=True)
         return
 
-    ok, status = quiz.save_answer(tg_id, question, answer)
+    ok, status = await _db(quiz.save_answer, tg_id, question, answer)
     if not ok and status == "already_answered":
         await callback.answer("Ответ уже принят")
         return
@@ -398,33 +512,33 @@ async def answer_handler(callback: CallbackQuery) -> None:
 
     await callback.answer("Принято")
 
+    # save_answer reports blocked/daily_done only for users without unlimited access.
     if status == "blocked":
-        await callback.message.answer(WRONG_STOP, reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(tg_id)))
+        await callback.message.answer(WRONG_STOP, reply_markup=start_kb(has_unlimited=False))
         return
 
     if status == "daily_done":
-        await callback.message.answer(DAILY_DONE, reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(tg_id)))
+        await callback.message.answer(DAILY_DONE, reply_markup=start_kb(has_unlimited=False))
         return
 
     if status == "correct":
-        await callback.message.answer("✅ Верно")
-        await send_next_question(callback.message, tg_id)
+        await send_next_question(callback.message, tg_id, prefix="✅ Верно")
         return
 
     if status == "wrong":
-        await callback.message.answer("❌ Неверно")
-        await send_next_question(callback.message, tg_id)
+        await send_next_question(callback.message, tg_id, prefix="❌ Неверно")
         return
 
-    await callback.message.answer("Есть ошибка.", reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(tg_id)))
+    await callback.message.answer("Есть ошибка.", reply_markup=start_kb(has_unlimited=await _db(quiz.has_unlimited_now, tg_id)))
 
 
 @dp.callback_query(F.data == "next")
 async def next_handler(callback: CallbackQuery) -> None:
     tg_id = callback.from_user.id
-    allowed, reason = quiz.can_start_quiz_now(tg_id)
+    has_unlimited = await _db(quiz.has_unlimited_now, tg_id)
+    allowed, reason = await _db(quiz.can_start_quiz_now, tg_id, has_unlimited=has_unlimited)
     if not allowed:
-        await callback.message.answer(reason or BLOCKED, reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(tg_id)))
+        await callback.message.answer(reason or BLOCKED, reply_markup=start_kb(has_unlimited=has_unlimited))
         await callback.answer()
         return
     await callback.answer()
@@ -434,12 +548,12 @@ async def next_handler(callback: CallbackQuery) -> None:
 @dp.callback_query(F.data == "menu")
 async def menu_handler(callback: CallbackQuery) -> None:
     await callback.answer()
-    await callback.message.answer("Открыл меню", reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(callback.from_user.id)))
+    await callback.message.answer("Открыл меню", reply_markup=start_kb(has_unlimited=await _db(quiz.has_unlimited_now, callback.from_user.id)))
 
 
 @dp.message(F.text == "Меню")
 async def menu_button(message: Message) -> None:
-    await message.answer("Выбери действие", reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(message.from_user.id)))
+    await message.answer("Выбери действие", reply_markup=start_kb(has_unlimited=await _db(quiz.has_unlimited_now, message.from_user.id)))
 
 
 def _leaderboard_title(metric: str) -> str:
@@ -478,46 +592,46 @@ async def rating_button(message: Message) -> None:
     await message.answer("Выбери тип рейтинга:", reply_markup=rating_type_kb())
 
 
-@dp.callback_query(F.data.startswith("rating:"))
+@dp.callback_query(CallbackPrefix("rating:"))
 async def rating_type_handler(callback: CallbackQuery) -> None:
     metric = callback.data.split(":", maxsplit=1)[1]
     if metric not in {"total_correct", "best_streak"}:
         await callback.answer("Неизвестный тип рейтинга", show_alert=True)
         return
 
-    rows = rating.top10(metric)
-    current_rank = rating.user_rank(callback.from_user.id, metric)
+    rows = await _db(rating.top10, metric)
+    current_rank = await _db(rating.user_rank, callback.from_user.id, metric)
     await callback.message.answer(_leaderboard_message(metric, rows, current_rank))
     await callback.answer()
 
 
 @dp.message(Command("stats"))
 async def cmd_stats(message: Message) -> None:
-    st = rating.user_stats(message.from_user.id)
+    st = await _db(rating.user_stats, message.from_user.id)
     await message.answer(_stats_message(st))
 
 
 @dp.message(F.text == "Моя статистика")
 async def my_stats_button(message: Message) -> None:
-    st = rating.user_stats(message.from_user.id)
+    st = await _db(rating.user_stats, message.from_user.id)
     await message.answer(_stats_message(st))
 
 
-@dp.callback_query(F.data.startswith("buy:"))
+@dp.callback_query(CallbackPrefix("buy:"))
 async def buy_handler(callback: CallbackQuery) -> None:
     kind = callback.data.split(":", maxsplit=1)[1]
-    if not settings.monetization_enabled:
+    if not MONETIZATION_ENABLED:
         await callback.answer("Покупки временно недоступны", show_alert=True)
         return
 
     if kind == payments.PACK10:
         title = "Пакет +10 вопросов"
         description = "Открывает +10 вопросов прямо сейчас"
-        amount = settings.pack10_stars
+        amount = PACK10_STARS
     else:
         title = "Безлимит 30 дней"
         description = "Бесконечный доступ + гибкие режимы"
-        amount = settings.unlimited30_stars
+        amount = UNLIMITED30_STARS
 
     payload = payments.payload_for_kind(kind)
     await bot.send_invoice(
@@ -544,7 +658,7 @@ async def successful_payment(message: Message) -> None:
     payload = payment.invoice_payload
     kind = payments.kind_from_payload(payload)
 
-    if not settings.monetization_enabled:
+    if not MONETIZATION_ENABLED:
         logger.info("Ignoring successful_payment while monetization disabled: tg_id=%s payload=%s", tg_id, payload)
         return
 
@@ -552,7 +666,7 @@ async def successful_payment(message: Message) -> None:
         await message.answer("Не удалось определить тип покупки. Напиши администратору.")
         return
 
-    expected_amount = settings.pack10_stars if kind == payments.PACK10 else settings.unlimited30_stars
+    expected_amount = PACK10_STARS if kind == payments.PACK10 else UNLIMITED30_STARS
     if payment.total_amount != expected_amount:
         logger.error(
             "Payment amount mismatch: tg_id=%s payload=%s expected=%s got=%s",
@@ -565,7 +679,8 @@ async def successful_payment(message: Message) -> None:
         return
 
     try:
-        result = entitlements.grant_purchase(
+        result = await _db(
+            entitlements.grant_purchase,
             tg_id=tg_id,
             payload=payload,
             amount=payment.total_amount,
@@ -578,11 +693,10 @@ async def successful_payment(message: Message) -> None:
             return
 
         if kind == payments.PACK10:
-            await message.answer("✅ Оплата принята. Добавлено +10 вопросов.", reply_markup=start_kb(has_unlimited=quiz.has_unlimited_now(tg_id)))
+            await message.answer("✅ Оплата принята. Добавлено +10 вопросов.", reply_markup=start_kb(has_unlimited=await _db(quiz.has_unlimited_now, tg_id)))
             return
 
-        until = datetime.fromisoformat(result["new_until"])
-        until_local = until.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+        until_local = _format_utc(datetime.fromisoformat(result["new_until"]))
         await message.answer(
             f"✅ Безлимит активирован до {until_local}.",
             reply_markup=start_kb(has_unlimited=True),
@@ -592,29 +706,29 @@ async def successful_payment(message: Message) -> None:
         await message.answer("Ошибка при обработке оплаты, мы уже видим платеж. Напиши администратору.")
 
 
-if settings.test_mode:
+if TEST_MODE:
     @dp.message(Command("test_pay_pack10"))
     async def cmd_test_pay_pack10(message: Message) -> None:
-        if not can_use_test_commands(message.from_user.id):
+        if not await can_use_test_commands(message.from_user.id):
             return
-        await process_test_payment(message, payments.PACK10_PAYLOAD, settings.pack10_stars)
+        await process_test_payment(message, payments.PACK10_PAYLOAD, PACK10_STARS)
 
 
     @dp.message(Command("test_pay_unlimited30"))
     async def cmd_test_pay_unlimited30(message: Message) -> None:
-        if not can_use_test_commands(message.from_user.id):
+        if not await can_use_test_commands(message.from_user.id):
             return
-        await process_test_payment(message, payments.UNLIMITED30_PAYLOAD, settings.unlimited30_stars)
+        await process_test_payment(message, payments.UNLIMITED30_PAYLOAD, UNLIMITED30_STARS)
 
 
 @dp.message(Command("my_payments"))
 async def cmd_my_payments(message: Message) -> None:
-    summary = payments.get_user_purchases_summary(message.from_user.id)
+    summary = await _db(payments.get_user_purchases_summary, message.from_user.id)
     unlimited_until = summary["unlimited_until"]
-    now = datetime.now(timezone.utc)
+    unlimited_active = bool(unlimited_until and unlimited_until > datetime.now(_UTC))
 
-    if unlimited_until and unlimited_until > now:
-        unlimited_line = f"активен до {unlimited_until.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}"
+    if unlimited_active:
+        unlimited_line = f"активен до {_format_utc(unlimited_until)}"
     else:
         unlimited_line = "не активен"
 
@@ -631,12 +745,12 @@ async def cmd_my_payments(message: Message) -> None:
         lines.append("— пока нет")
     else:
         for row in recent:
-            created_at = datetime.fromisoformat(row["created_at"].replace("Z", "+00:00")).astimezone(timezone.utc)
+            created_at = datetime.fromisoformat(row["created_at"]).astimezone(_UTC)
             lines.append(
-                f"— {created_at.strftime('%Y-%m-%d %H:%M')} | {row['invoice_payload']} | {row['total_amount']} {row['currency']}"
+                f"— {created_at.strftime(DATETIME_FORMAT)} | {row['invoice_payload']} | {row['total_amount']} {row['currency']}"
             )
 
-    await message.answer("\n".join(lines), reply_markup=start_kb(has_unlimited=bool(unlimited_until and unlimited_until > now)))
+    await message.answer("\n".join(lines), reply_markup=start_kb(has_unlimited=unlimited_active))
 
 
 @dp.message(F.text == "Мои покупки")
@@ -646,25 +760,24 @@ async def my_payments_button(message: Message) -> None:
 
 @dp.message(F.text == "Настройки безлимита")
 async def unlimited_settings(message: Message) -> None:
-    if not quiz.has_unlimited_now(message.from_user.id):
-        await message.answer("Опция доступна только при активном безлимите", reply_markup=buy_kb(settings.monetization_enabled))
+    if not await _db(quiz.has_unlimited_now, message.from_user.id):
+        await message.answer("Опция доступна только при активном безлимите", reply_markup=buy_kb(MONETIZATION_ENABLED))
         return
     await message.answer("Выбери режим выдачи:", reply_markup=unlimited_settings_kb())
 
 
-@dp.callback_query(F.data.startswith("setmode:"))
+@dp.callback_query(CallbackPrefix("setmode:"))
 async def setmode_handler(callback: CallbackQuery, state: FSMContext) -> None:
     mode = callback.data.split(":", maxsplit=1)[1]
     tg_id = callback.from_user.id
     if mode == "random":
-        db.client.table("user_settings").update({"mode": "random", "topic_id": None, "difficulty": None}).eq("tg_id", tg_id).execute()
+        await _db(quiz.set_mode, tg_id, "random")
         await callback.message.answer("Режим random включён")
     elif mode == "topic":
-        rows = db.client.table("topics").select("id,title").eq("is_active", True).limit(100).execute().data or []
-        if not rows:
+        listing = await _db(_active_topics_listing)
+        if not listing:
             await callback.message.answer("Нет активных тем")
             return
-        listing = "\n".join([f"{r['id']}: {r['title']}" for r in rows])
         await state.set_state(UnlimitedFSM.topic)
         await callback.message.answer(f"Отправь ID темы:\n{listing}")
     else:
@@ -677,7 +790,7 @@ async def setmode_handler(callback: CallbackQuery, state: FSMContext) -> None:
 async def set_topic(message: Message, state: FSMContext) -> None:
     tg_id = message.from_user.id
     topic_id = int(message.text.strip())
-    db.client.table("user_settings").update({"mode": "topic", "topic_id": topic_id, "difficulty": None}).eq("tg_id", tg_id).execute()
+    await _db(quiz.set_mode, tg_id, "topic", topic_id=topic_id)
     await message.answer("Режим topic включён")
     await state.clear()
 
@@ -689,16 +802,16 @@ async def set_difficulty(message: Message, state: FSMContext) -> None:
     if difficulty < 1 or difficulty > 5:
         await message.answer("Нужно число 1..5")
         return
-    db.client.table("user_settings").update({"mode": "difficulty", "difficulty": difficulty, "topic_id": None}).eq("tg_id", tg_id).execute()
+    await _db(quiz.set_mode, tg_id, "difficulty", difficulty=difficulty)
     await message.answer("Режим difficulty включён")
     await state.clear()
 
 
 @dp.message(Command("admin_stats"))
 async def cmd_admin_stats(message: Message) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         return
-    st = admin_logic.admin_stats()
+    st = await _db(admin_logic.admin_stats)
     await message.answer(
         f"Пользователей: {st['total_users']}\nОтветов: {st['total_answers']}\nАктивных безлимитов: {st['active_unlimited']}"
     )
@@ -706,7 +819,7 @@ async def cmd_admin_stats(message: Message) -> None:
 
 @dp.message(Command("admin"))
 async def cmd_admin(message: Message, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         return
     await state.clear()
     await message.answer("Админ-меню:", reply_markup=admin_menu_kb())
@@ -714,7 +827,7 @@ async def cmd_admin(message: Message, state: FSMContext) -> None:
 
 @dp.callback_query(F.data == "admin:add_question")
 async def admin_add_question(callback: CallbackQuery, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(callback.from_user.id):
+    if not await _db(admin_logic.has_admin_access, callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     await state.clear()
@@ -725,7 +838,7 @@ async def admin_add_question(callback: CallbackQuery, state: FSMContext) -> None
 
 @dp.callback_query(F.data == "admin:bulk_import")
 async def admin_bulk_import_prompt(callback: CallbackQuery, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(callback.from_user.id):
+    if not await _db(admin_logic.has_admin_access, callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     await state.clear()
@@ -748,36 +861,17 @@ async def admin_bulk_import_prompt(callback: CallbackQuery, state: FSMContext) -
 
 @dp.message(AdminFSM.bulk_import)
 async def admin_bulk_import_input(message: Message, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         await state.clear()
         return
 
-    blocks = _split_bulk_blocks((message.text or "").strip())
-    if not blocks:
+    # Parsing hundreds of blocks is CPU-bound; keep it off the event loop.
+    valid_payloads, errors = await asyncio.to_thread(_parse_bulk_blocks, (message.text or "").strip())
+    if not valid_payloads and not errors:
         await message.answer("Не нашёл ни одного блока для импорта")
         return
 
-    ok_count = 0
-    duplicate_count = 0
-    errors: list[str] = []
-    valid_payloads: list[dict] = []
-
-    for idx, block in enumerate(blocks, start=1):
-        try:
-            payload = _parse_bulk_block(block)
-            valid_payloads.append(payload)
-        except Exception as exc:
-            errors.append(f"Блок {idx}: {exc}")
-
-    for payload in valid_payloads:
-        try:
-            db.client.table("questions").insert(payload).execute()
-            ok_count += 1
-        except Exception as exc:
-            if _is_duplicate_q_hash_error(exc):
-                duplicate_count += 1
-                continue
-            errors.append(f"Вставка '{payload.get('q', '')[:80]}': {exc}")
+    ok_count, duplicate_count = await _db(_insert_bulk_payloads, valid_payloads, errors) if valid_payloads else (0, 0)
 
     await state.clear()
     await message.answer(_bulk_import_report(ok_count=ok_count, duplicate_count=duplicate_count, errors=errors))
@@ -785,7 +879,7 @@ async def admin_bulk_import_input(message: Message, state: FSMContext) -> None:
 
 @dp.callback_query(F.data == "admin:file_import")
 async def admin_file_import_prompt(callback: CallbackQuery, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(callback.from_user.id):
+    if not await _db(admin_logic.has_admin_access, callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     await state.clear()
@@ -800,7 +894,7 @@ async def admin_file_import_prompt(callback: CallbackQuery, state: FSMContext) -
 
 @dp.message(AdminFSM.file_import)
 async def admin_file_import_input(message: Message, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         await state.clear()
         return
 
@@ -837,8 +931,9 @@ async def admin_file_import_input(message: Message, state: FSMContext) -> None:
         await message.answer(f"Не удалось прочитать CSV: {exc}")
         return
 
-    payloads, errors = _parse_csv_questions(csv_text)
-    inserted, duplicates = _bulk_insert_questions(payloads, errors) if payloads else (0, 0)
+    # Parsing resolves topic names against the DB, so it runs off the loop as well.
+    payloads, errors = await _db(_parse_csv_questions, csv_text)
+    inserted, duplicates = await _db(_bulk_insert_questions, payloads, errors) if payloads else (0, 0)
 
     logger.info(
         "Импорт CSV завершен: admin=%s inserted=%s duplicates=%s errors=%s",
@@ -855,14 +950,25 @@ async def admin_file_import_input(message: Message, state: FSMContext) -> None:
     )
 
 
+QUESTION_LIST_TEXT_WIDTH = 70
+
+
+def _short_question_text(raw: str) -> str:
+    # Fast path: short single-line questions need no replace/slice copies
+    if "\n" not in raw and len(raw) <= QUESTION_LIST_TEXT_WIDTH:
+        return raw.strip()
+    text = raw.replace("\n", " ").strip()
+    return text[:QUESTION_LIST_TEXT_WIDTH] + "..." if len(text) > QUESTION_LIST_TEXT_WIDTH else text
+
+
 @dp.callback_query(F.data == "admin:list_questions")
 async def admin_list_questions(callback: CallbackQuery) -> None:
-    if not admin_logic.has_admin_access(callback.from_user.id):
+    if not await _db(admin_logic.has_admin_access, callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
 
-    rows = (
-        db.client.table("questions")
+    rows = await _db(
+        lambda: db.client.table("questions")
         .select("id,text,is_active")
         .order("id", desc=True)
         .limit(10)
@@ -876,16 +982,14 @@ async def admin_list_questions(callback: CallbackQuery) -> None:
         lines = ["Последние 10 вопросов:"]
         for row in rows:
             status = "✅" if row.get("is_active") else "⛔"
-            text = (row.get("text") or "").replace("\n", " ").strip()
-            short_text = text[:70] + "..." if len(text) > 70 else text
-            lines.append(f"{row['id']}. {status} {short_text}")
+            lines.append(f"{row['id']}. {status} {_short_question_text(row.get('text') or '')}")
         await callback.message.answer("\n".join(lines))
     await callback.answer()
 
 
 @dp.callback_query(F.data == "admin:toggle_question")
 async def admin_toggle_prompt(callback: CallbackQuery, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(callback.from_user.id):
+    if not await _db(admin_logic.has_admin_access, callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     await state.set_state(AdminFSM.toggle_question)
@@ -895,7 +999,7 @@ async def admin_toggle_prompt(callback: CallbackQuery, state: FSMContext) -> Non
 
 @dp.message(AdminFSM.toggle_question)
 async def admin_toggle_question(message: Message, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         await state.clear()
         return
 
@@ -905,20 +1009,18 @@ async def admin_toggle_question(message: Message, state: FSMContext) -> None:
         return
 
     qid = int(text)
-    rows = db.client.table("questions").select("id,is_active").eq("id", qid).limit(1).execute().data or []
-    if not rows:
+    is_active = await _db(_toggle_question, qid)
+    if is_active is None:
         await message.answer("Вопрос не найден")
         return
 
-    is_active = bool(rows[0]["is_active"])
-    db.client.table("questions").update({"is_active": not is_active}).eq("id", qid).execute()
     await state.clear()
-    await message.answer(f"Статус вопроса {qid}: {'активен' if not is_active else 'выключен'}")
+    await message.answer(f"Статус вопроса {qid}: {'активен' if is_active else 'выключен'}")
 
 
 @dp.callback_query(F.data == "admin:grant_admin")
 async def admin_grant_prompt(callback: CallbackQuery, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(callback.from_user.id):
+    if not await _db(admin_logic.has_admin_access, callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     await state.set_state(AdminFSM.grant_admin)
@@ -928,7 +1030,7 @@ async def admin_grant_prompt(callback: CallbackQuery, state: FSMContext) -> None
 
 @dp.message(AdminFSM.grant_admin)
 async def admin_grant_input(message: Message, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         await state.clear()
         return
 
@@ -938,14 +1040,14 @@ async def admin_grant_input(message: Message, state: FSMContext) -> None:
         return
 
     target = int(text)
-    ok = admin_logic.grant_admin(message.from_user.id, target, "editor")
+    ok = await _db(admin_logic.grant_admin, message.from_user.id, target, "editor")
     await state.clear()
     await message.answer("Админка выдана (role=editor)" if ok else "Недостаточно прав")
 
 
 @dp.callback_query(F.data == "admin:grant_unlimited")
 async def admin_grant_unlimited_prompt(callback: CallbackQuery, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(callback.from_user.id):
+    if not await _db(admin_logic.has_admin_access, callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     await state.clear()
@@ -956,7 +1058,7 @@ async def admin_grant_unlimited_prompt(callback: CallbackQuery, state: FSMContex
 
 @dp.message(AdminFSM.grant_unlimited_tg_id)
 async def admin_grant_unlimited_tg_id_input(message: Message, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         await state.clear()
         return
 
@@ -970,9 +1072,9 @@ async def admin_grant_unlimited_tg_id_input(message: Message, state: FSMContext)
     await message.answer("Выбери срок безлимита:", reply_markup=admin_unlimited_days_kb())
 
 
-@dp.callback_query(F.data.startswith("admin:grant_unlimited_days:"))
+@dp.callback_query(CallbackPrefix("admin:grant_unlimited_days:"))
 async def admin_grant_unlimited_days_pick(callback: CallbackQuery, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(callback.from_user.id):
+    if not await _db(admin_logic.has_admin_access, callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         await state.clear()
         return
@@ -992,8 +1094,8 @@ async def admin_grant_unlimited_days_pick(callback: CallbackQuery, state: FSMCon
         return
 
     days = int(choice)
-    new_until = entitlements.grant_unlimited_days(target_tg_id, days)
-    until_utc = new_until.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    new_until = await _db(entitlements.grant_unlimited_days, target_tg_id, days)
+    until_utc = _format_utc(new_until)
     logger.info(
         "Админ выдал безлимит: admin=%s target=%s days=%s until=%s",
         callback.from_user.id,
@@ -1008,7 +1110,7 @@ async def admin_grant_unlimited_days_pick(callback: CallbackQuery, state: FSMCon
 
 @dp.message(AdminFSM.grant_unlimited_manual_days)
 async def admin_grant_unlimited_manual_days_input(message: Message, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         await state.clear()
         return
 
@@ -1029,8 +1131,8 @@ async def admin_grant_unlimited_manual_days_input(message: Message, state: FSMCo
         await message.answer("Нужно число дней 1..365")
         return
 
-    new_until = entitlements.grant_unlimited_days(target_tg_id, days)
-    until_utc = new_until.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    new_until = await _db(entitlements.grant_unlimited_days, target_tg_id, days)
+    until_utc = _format_utc(new_until)
     logger.info(
         "Админ выдал безлимит: admin=%s target=%s days=%s until=%s",
         message.from_user.id,
@@ -1044,7 +1146,7 @@ async def admin_grant_unlimited_manual_days_input(message: Message, state: FSMCo
 
 @dp.callback_query(F.data == "admin:revoke_unlimited")
 async def admin_revoke_unlimited_prompt(callback: CallbackQuery, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(callback.from_user.id):
+    if not await _db(admin_logic.has_admin_access, callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     await state.clear()
@@ -1055,7 +1157,7 @@ async def admin_revoke_unlimited_prompt(callback: CallbackQuery, state: FSMConte
 
 @dp.message(AdminFSM.revoke_unlimited_tg_id)
 async def admin_revoke_unlimited_input(message: Message, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         await state.clear()
         return
 
@@ -1065,7 +1167,7 @@ async def admin_revoke_unlimited_input(message: Message, state: FSMContext) -> N
         return
 
     target_tg_id = int(text)
-    revoked_at = entitlements.revoke_unlimited(target_tg_id)
+    revoked_at = await _db(entitlements.revoke_unlimited, target_tg_id)
     logger.info(
         "Админ снял безлимит: admin=%s target=%s revoked_at=%s",
         message.from_user.id,
@@ -1084,7 +1186,7 @@ async def cmd_grant_admin(message: Message) -> None:
         return
     target = int(parts[1])
     role = parts[2].strip()
-    ok = admin_logic.grant_admin(message.from_user.id, target, role)
+    ok = await _db(admin_logic.grant_admin, message.from_user.id, target, role)
     await message.answer("OK" if ok else "Недостаточно прав")
 
 
@@ -1095,13 +1197,13 @@ async def cmd_revoke_admin(message: Message) -> None:
         await message.answer("Использование: /revoke_admin <tg_id>")
         return
     target = int(parts[1])
-    ok = admin_logic.revoke_admin(message.from_user.id, target)
+    ok = await _db(admin_logic.revoke_admin, message.from_user.id, target)
     await message.answer("OK" if ok else "Недостаточно прав")
 
 
 @dp.message(Command("add_question"))
 async def cmd_add_question(message: Message, state: FSMContext) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         return
     await state.clear()
     await state.set_state(AddQuestionFSM.text)
@@ -1154,12 +1256,10 @@ async def aq_correct(message: Message, state: FSMContext) -> None:
         await message.answer("Нужно число 1..4")
         return
     await state.update_data(correct_option=int(text))
-    rows = db.client.table("topics").select("id,title").eq("is_active", True).order("id").limit(100).execute().data or []
-    if rows:
-        topic_lines = [f"{row['id']}: {row['title']}" for row in rows]
+    listing = await _db(_active_topics_listing)
+    if listing:
         await message.answer(
-            "Тема (опционально): отправь ID из списка или название новой темы. Для пропуска отправь -\n"
-            + "\n".join(topic_lines)
+            "Тема (опционально): отправь ID из списка или название новой темы. Для пропуска отправь -\n" + listing
         )
     else:
         await message.answer("Тема (опционально): отправь название новой темы или '-' для пропуска")
@@ -1172,16 +1272,19 @@ async def aq_topic(message: Message, state: FSMContext) -> None:
     topic_id = None
     if text and text != "-":
         if text.isdigit():
-            rows = db.client.table("topics").select("id").eq("id", int(text)).limit(1).execute().data or []
+            rows = await _db(lambda: db.client.table("topics").select("id").eq("id", int(text)).limit(1).execute().data or [])
             if not rows:
                 await message.answer("Тема с таким ID не найдена")
                 return
             topic_id = int(text)
         else:
-            created = db.client.table("topics").insert({"title": text, "is_active": True}).execute().data or []
+            created = await _db(
+                lambda: db.client.table("topics").insert({"title": text, "is_active": True}).execute().data or []
+            )
             if not created:
                 await message.answer("Не удалось создать тему")
                 return
+            _invalidate_topics_listing()
             topic_id = int(created[0]["id"])
     await state.update_data(topic_id=topic_id)
     await state.set_state(AddQuestionFSM.difficulty)
@@ -1213,29 +1316,47 @@ async def aq_done(message: Message, state: FSMContext) -> None:
     if difficulty is not None:
         payload["difficulty"] = difficulty
 
-    db.client.table("questions").insert(payload).execute()
+    await _db(lambda: db.client.table("questions").insert(payload).execute())
+    quiz.bust_questions_cache()
     await state.clear()
     await message.answer("Вопрос добавлен")
 
 
 @dp.message(Command("toggle_question"))
 async def cmd_toggle_question(message: Message) -> None:
-    if not admin_logic.has_admin_access(message.from_user.id):
+    if not await _db(admin_logic.has_admin_access, message.from_user.id):
         return
     parts = message.text.split()
     if len(parts) != 2:
         await message.answer("Использование: /toggle_question <id>")
         return
     qid = int(parts[1])
-    row = db.client.table("questions").select("id,is_active").eq("id", qid).single().execute().data
-    db.client.table("questions").update({"is_active": not bool(row["is_active"])}).eq("id", qid).execute()
+    if await _db(_toggle_question, qid) is None:
+        await message.answer("Вопрос не найден")
+        return
     await message.answer("Статус переключён")
 
 
+async def refresh_ranks_periodically() -> None:
+    while True:
+        try:
+            await _db(rating.refresh_ranks)
+        except Exception:
+            logger.warning("Не удалось обновить users_ranked", exc_info=True)
+        await asyncio.sleep(rating.RANKS_REFRESH_INTERVAL_SECONDS)
+
+
 async def main() -> None:
     db.ensure_schema()
-    await dp.start_polling(bot)
+    ranks_task = asyncio.create_task(refresh_ranks_periodically())
+    try:
+        await dp.start_polling(bot)
+    finally:
+        ranks_task.cancel()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
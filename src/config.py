@@ -19,7 +19,7 @@ class Settings:
     unlimited30_stars: int = 1500
     test_mode: bool = False
     monetization_enabled: bool = False
-    admin_tg_ids: tuple[int, ...] = ()
+    admin_tg_ids: frozenset[int] = frozenset()
 
 
 
@@ -36,16 +36,16 @@ def _parse_bool(value: str | None) -> bool:
     return value.strip().lower() in {"1", "true", "yes", "on"}
 
 
-def _parse_admin_tg_ids(value: str | None) -> tuple[int, ...]:
+def _parse_admin_tg_ids(value: str | None) -> frozenset[int]:
     if not value:
-        return ()
+        return frozenset()
     result: list[int] = []
     for item in value.split(","):
         token = item.strip()
         if not token:
             continue
         result.append(int(token))
-    return tuple(result)
+    return frozenset(result)
 
 
 settings = Settings(
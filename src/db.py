@@ -1,19 +1,37 @@
 from __future__ import annotations
 
 import logging
+from pathlib import Path
 from typing import Any
 
+import httpx
 import requests
-from supabase import Client, create_client
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+from supabase import Client, ClientOptions, create_client
 
 from src.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Keeps a single insert request well under PostgREST's request body limit.
+QUESTIONS_INSERT_CHUNK_SIZE = 500
+
+POSTGREST_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+# Versioned scripts applied after the inline tables; the last one sets bot_schema_version().
+SCHEMA_SCRIPTS = ("004_functions.sql", "005_users_ranked.sql")
+REQUIRED_SCHEMA_VERSION = 5
+
 
 class Database:
     def __init__(self) -> None:
-        self.client: Client = create_client(settings.supabase_url, settings.supabase_service_role_key)
+        self.client: Client = create_client(
+            settings.supabase_url,
+            settings.supabase_service_role_key,
+            options=ClientOptions(postgrest_client_timeout=POSTGREST_TIMEOUT),
+        )
 
     def _run_sql_via_pg_endpoint(self, sql: str) -> bool:
         """
@@ -62,29 +80,58 @@ class Database:
         alter table if exists public.users add column if not exists total_wrong integer not null default 0;
         alter table if exists public.users add column if not exists best_streak integer not null default 0;
         """.strip()
+        scripts_sql = "\n\n".join((SCRIPTS_DIR / name).read_text(encoding="utf-8") for name in SCHEMA_SCRIPTS)
 
-        if self._run_sql_via_pg_endpoint(migration_sql):
+        if self._run_sql_via_pg_endpoint(f"{migration_sql}\n\n{scripts_sql}"):
             logger.info("Schema ensured via /pg/v1/query")
-            return
-
+        else:
+            try:
+                self.client.table("user_settings").select("tg_id").limit(1).execute()
+                logger.info("user_settings already exists")
+            except Exception:
+                logger.error("Unable to auto-create user_settings. Run scripts manually with SQL:\n%s", migration_sql)
+
+        self.check_schema_version()
+
+    def check_schema_version(self) -> None:
+        # Answers, /start, stats, payments and admin commands all go through the RPC functions,
+        # so refuse to start instead of failing on every request.
         try:
-            self.client.table("user_settings").select("tg_id").limit(1).execute()
-            logger.info("user_settings already exists")
-        except Exception:
-            logger.error("Unable to auto-create user_settings. Run scripts manually with SQL:\n%s", migration_sql)
-
-    def upsert_user(self, tg_id: int, first_name: str | None, username: str | None) -> None:
-        payload = {
-            "tg_id": tg_id,
-            "first_name": first_name,
-            "username": username,
-        }
-        self.client.table("users").upsert(payload, on_conflict="tg_id").execute()
+            version = self.client.rpc("bot_schema_version", {}).execute().data
+        except APIError as exc:
+            logger.error("bot_schema_version() is not available: %s", exc)
+            version = None
+        if version is None or int(version) < REQUIRED_SCHEMA_VERSION:
+            raise RuntimeError(
+                f"Database schema version {version} is older than required {REQUIRED_SCHEMA_VERSION}. "
+                f"Apply {', '.join(f'scripts/{name}' for name in SCHEMA_SCRIPTS)} (see README)."
+            )
+
+    def bootstrap_user(self, tg_id: int, first_name: str | None, username: str | None) -> None:
+        # Upserts users and user_settings in one call.
+        self.client.rpc(
+            "bootstrap_user",
+            {"p_tg": tg_id, "p_first_name": first_name, "p_username": username},
+        ).execute()
 
     def ensure_user_settings(self, tg_id: int) -> dict[str, Any]:
-        self.client.table("user_settings").upsert({"tg_id": tg_id}, on_conflict="tg_id").execute()
-        data = self.client.table("user_settings").select("*").eq("tg_id", tg_id).single().execute().data
-        return data
+        # The upsert returns the stored row (Prefer: return=representation), so no follow-up select.
+        rows = (
+            self.client.table("user_settings")
+            .upsert({"tg_id": tg_id}, on_conflict="tg_id", returning=ReturnMethod.representation)
+            .execute()
+            .data
+        )
+        return rows[0]
+
+    def insert_questions_bulk(self, rows: list[dict[str, Any]]) -> int:
+        inserted = 0
+        for start in range(0, len(rows), QUESTIONS_INSERT_CHUNK_SIZE):
+            chunk = rows[start : start + QUESTIONS_INSERT_CHUNK_SIZE]
+            # default_to_null=False lets omitted optional columns fall back to their defaults.
+            self.client.table("questions").insert(chunk, default_to_null=False).execute()
+            inserted += len(chunk)
+        return inserted
 
 
 db = Database()
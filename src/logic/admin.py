@@ -1,20 +1,39 @@
 from __future__ import annotations
 
+import time
+
 from src.config import settings
 from src.db import db
 
 ROLE_ORDER = {"editor": 1, "admin": 2, "owner": 3}
+ROLE_CACHE_TTL_SECONDS = 60.0
+ROLE_CACHE_MAX_SIZE = 1024
+
+_role_cache: dict[int, tuple[float, str | None]] = {}
 
 
 def get_admin_role(tg_id: int) -> str | None:
+    now = time.monotonic()
+    cached = _role_cache.get(tg_id)
+    if cached is not None and now - cached[0] < ROLE_CACHE_TTL_SECONDS:
+        return cached[1]
+
     rows = db.client.table("admins").select("role").eq("tg_id", tg_id).limit(1).execute().data
-    return rows[0]["role"] if rows else None
+    role = rows[0]["role"] if rows else None
+    if len(_role_cache) >= ROLE_CACHE_MAX_SIZE:
+        _role_cache.clear()
+    _role_cache[tg_id] = (now, role)
+    return role
 
 
 def has_admin_access(tg_id: int) -> bool:
     return get_admin_role(tg_id) is not None
 
 
+def invalidate_role(tg_id: int) -> None:
+    _role_cache.pop(tg_id, None)
+
+
 def can_grant(granter_id: int, role: str) -> bool:
     granter_role = get_admin_role(granter_id)
     if not granter_role:
@@ -32,36 +51,38 @@ def grant_admin(granter_id: int, target_tg_id: int, role: str) -> bool:
     if not can_grant(granter_id, role):
         return False
     db.client.table("admins").upsert({"tg_id": target_tg_id, "role": role}, on_conflict="tg_id").execute()
+    invalidate_role(target_tg_id)
     return True
 
 
 def revoke_admin(granter_id: int, target_tg_id: int) -> bool:
     granter_role = get_admin_role(granter_id)
-    target_role = get_admin_role(target_tg_id)
-    if not granter_role or not target_role:
+    if not granter_role:
         return False
-    if ROLE_ORDER[granter_role] <= ROLE_ORDER[target_role]:
+    revocable_roles = [role for role, rank in ROLE_ORDER.items() if rank < ROLE_ORDER[granter_role]]
+    if not revocable_roles:
         return False
-    db.client.table("admins").delete().eq("tg_id", target_tg_id).execute()
+    deleted = (
+        db.client.table("admins")
+        .delete()
+        .eq("tg_id", target_tg_id)
+        .in_("role", revocable_roles)
+        .execute()
+        .data
+    )
+    if not deleted:
+        return False
+    invalidate_role(target_tg_id)
     return True
 
 
 def admin_stats() -> dict:
-    total_users = db.client.table("users").select("tg_id", count="exact").limit(1).execute().count or 0
-    total_answers = db.client.table("answers").select("id", count="exact").limit(1).execute().count or 0
-    active_subs = (
-        db.client.table("subscriptions")
-        .select("tg_id", count="exact")
-        .gt("unlimited_until", "now()")
-        .limit(1)
-        .execute()
-        .count
-        or 0
-    )
+    # All three counts come back from one admin_stats() SQL function call.
+    stats = db.client.rpc("admin_stats", {}).execute().data or {}
     return {
-        "total_users": total_users,
-        "total_answers": total_answers,
-        "active_unlimited": active_subs,
+        "total_users": int(stats.get("total_users") or 0),
+        "total_answers": int(stats.get("total_answers") or 0),
+        "active_unlimited": int(stats.get("active_unlimited") or 0),
     }
 
 
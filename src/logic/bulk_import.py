@@ -1,48 +1,47 @@
 from __future__ import annotations
 
+import io
 import re
+from collections.abc import Callable
 
 QUESTION_START_RE = re.compile(r"^\s*(?:Q|В)\s*:\s*", flags=re.IGNORECASE)
-OPTION_RE = re.compile(r"^([ABCD])\s*[\):]\s*(.+)$", flags=re.IGNORECASE)
-FIELD_RE = re.compile(r"^([A-ZА-Я_]+)\s*:\s*(.*)$", flags=re.IGNORECASE)
-SEPARATOR_RE = re.compile(r"^\s*---\s*$")
+# Option or question line in one pass; applied with fullmatch() to stripped lines, so no ^/$ anchors.
+LINE_RE = re.compile(
+    r"(?P<letter>[ABCD])\s*[\):]\s*(?P<option>.+)|(?:Q|В)\s*:\s*(?P<question>.*)",
+    flags=re.IGNORECASE,
+)
+# Only consulted to tell an unknown field apart from garbage; keys are split off with partition().
+FIELD_KEY_RE = re.compile(r"[A-ZА-Я_]+")
+# A whole "---" line; [^\S\n] keeps the match from spilling into neighbouring lines.
+SEPARATOR_RE = re.compile(r"^[^\S\n]*---[^\S\n]*$", flags=re.MULTILINE)
+ANSWER_LETTERS = frozenset("ABCD")
+ANSWER_INDEX = {"A": 1, "B": 2, "C": 3, "D": 4}
 
 
 def split_bulk_blocks(raw_text: str) -> list[str]:
-    lines = raw_text.splitlines()
-
     # Primary format: explicit separator line with ---
-    if any(SEPARATOR_RE.match(line) for line in lines):
-        blocks: list[str] = []
-        current: list[str] = []
-        for line in lines:
-            if SEPARATOR_RE.match(line):
-                block = "\n".join(current).strip()
-                if block:
-                    blocks.append(block)
-                current = []
-                continue
-            current.append(line)
-        tail = "\n".join(current).strip()
-        if tail:
-            blocks.append(tail)
-        return blocks
+    parts = SEPARATOR_RE.split(raw_text)
+    if len(parts) > 1:
+        return [block for block in (part.strip() for part in parts) if block]
 
     # Fallback format: no separators, each new question begins with Q:/В:
-    blocks = []
-    current = []
-    for line in lines:
-        if QUESTION_START_RE.match(line) and current:
-            blocks.append("\n".join(current).strip())
-            current = [line]
-            continue
+    # Stream the lines (newline=None folds \r\n and \r into \n) instead of materializing splitlines().
+    blocks: list[str] = []
+    current: list[str] = []
+    for line in io.StringIO(raw_text, newline=None):
+        line = line.rstrip("\n")
+        if current and QUESTION_START_RE.match(line):
+            block = "\n".join(current).strip()
+            if block:
+                blocks.append(block)
+            current = []
         current.append(line)
 
     tail = "\n".join(current).strip()
     if tail:
         blocks.append(tail)
 
-    return [block for block in blocks if block]
+    return blocks
 
 
 def parse_bool(value: str) -> bool | None:
@@ -63,58 +62,90 @@ def resolve_topic_id(topic_raw: str) -> int:
     return int(topic_value)
 
 
+def _field_ans(value: str, payload: dict) -> None:
+    answer_letter = value.upper()
+    if answer_letter not in ANSWER_LETTERS:
+        raise ValueError("ANS должен быть A/B/C/D")
+    payload["correct"] = ANSWER_INDEX[answer_letter]
+
+
+def _field_topic_id(value: str, payload: dict) -> None:
+    if value:
+        payload["topic_id"] = resolve_topic_id(value)
+
+
+def _field_diff(value: str, payload: dict) -> None:
+    if not value:
+        return
+    if not value.isdigit() or not (1 <= int(value) <= 5):
+        raise ValueError("DIFF должен быть числом 1..5")
+    payload["difficulty"] = int(value)
+
+
+def _field_active(value: str, payload: dict) -> None:
+    if not value:
+        return
+    bool_value = parse_bool(value)
+    if bool_value is None:
+        raise ValueError("ACTIVE должен быть true/false")
+    payload["is_active"] = bool_value
+
+
+def _field_q(value: str, payload: dict) -> None:
+    payload["q"] = value
+
+
+_FIELD_HANDLERS: dict[str, Callable[[str, dict], None]] = {
+    "ANS": _field_ans,
+    "TOPIC_ID": _field_topic_id,
+    "DIFF": _field_diff,
+    "ACTIVE": _field_active,
+    "Q": _field_q,
+    "В": _field_q,
+}
+
+
 def parse_bulk_block(block: str) -> dict:
     payload: dict = {"is_active": True}
     options: dict[str, str] = {}
 
-    for raw_line in block.splitlines():
+    for raw_line in io.StringIO(block, newline=None):
         line = raw_line.strip()
         if not line:
             continue
 
-        option_match = OPTION_RE.match(line)
-        if option_match:
-            letter = option_match.group(1).upper()
-            options[letter] = option_match.group(2).strip()
+        # Fast path for the common "A) text" spelling; other option forms go through LINE_RE.
+        if len(line) > 2 and line[1] == ")" and line[0].upper() in ANSWER_LETTERS:
+            options[line[0].upper()] = line[2:].strip()
             continue
 
-        q_match = QUESTION_START_RE.match(line)
-        if q_match:
-            payload["q"] = re.sub(QUESTION_START_RE, "", line, count=1).strip()
+        # Every valid non-option line is "KEY: value", and every option carries ")" or ":".
+        if ":" not in line and ")" not in line:
+            raise ValueError(f"непонятная строка: {line}")
+
+        line_match = LINE_RE.fullmatch(line)
+        if line_match:
+            letter = line_match.group("letter")
+            if letter:
+                options[letter.upper()] = line_match.group("option").strip()
+            else:
+                payload["q"] = line_match.group("question").strip()
             continue
 
-        field_match = FIELD_RE.match(line)
-        if not field_match:
+        head, sep, value = line.partition(":")
+        if not sep:
             raise ValueError(f"непонятная строка: {line}")
 
-        key = field_match.group(1).upper()
-        value = field_match.group(2).strip()
-
-        if key == "ANS":
-            answer_letter = value.upper()
-            if answer_letter not in {"A", "B", "C", "D"}:
-                raise ValueError("ANS должен быть A/B/C/D")
-            payload["correct"] = {"A": 1, "B": 2, "C": 3, "D": 4}[answer_letter]
-        elif key == "TOPIC_ID":
-            if value:
-                payload["topic_id"] = resolve_topic_id(value)
-        elif key == "DIFF":
-            if not value:
-                continue
-            if not value.isdigit() or not (1 <= int(value) <= 5):
-                raise ValueError("DIFF должен быть числом 1..5")
-            payload["difficulty"] = int(value)
-        elif key == "ACTIVE":
-            if not value:
-                continue
-            bool_value = parse_bool(value)
-            if bool_value is None:
-                raise ValueError("ACTIVE должен быть true/false")
-            payload["is_active"] = bool_value
-        elif key in {"Q", "В"}:
-            payload["q"] = value
-        else:
+        key = head.strip().upper()
+        value = value.strip()
+
+        handler = _FIELD_HANDLERS.get(key)
+        if handler is not None:
+            handler(value, payload)
+        elif FIELD_KEY_RE.fullmatch(key):
             raise ValueError(f"неизвестное поле {key}")
+        else:
+            raise ValueError(f"непонятная строка: {line}")
 
     if not payload.get("q"):
         raise ValueError("не заполнен Q")
@@ -135,3 +166,14 @@ def parse_bulk_block(block: str) -> dict:
         }
     )
     return payload
+
+
+def parse_bulk_blocks(raw_text: str) -> tuple[list[dict], list[str]]:
+    payloads: list[dict] = []
+    errors: list[str] = []
+    for idx, block in enumerate(split_bulk_blocks(raw_text), start=1):
+        try:
+            payloads.append(parse_bulk_block(block))
+        except Exception as exc:
+            errors.append(f"Блок {idx}: {exc}")
+    return payloads, errors
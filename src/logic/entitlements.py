@@ -1,29 +1,15 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from typing import Any
 
 from src.db import db
-from src.logic import payments
+from src.logic import payments, quiz
 
 
 _VALID_PAYLOADS = {payments.PACK10_PAYLOAD, payments.UNLIMITED30_PAYLOAD}
 
 
-def _current_unlimited_until(tg_id: int) -> datetime | None:
-    row = (
-        db.client.table("subscriptions")
-        .select("unlimited_until")
-        .eq("tg_id", tg_id)
-        .limit(1)
-        .execute()
-        .data
-    )
-    if not row or not row[0].get("unlimited_until"):
-        return None
-    return datetime.fromisoformat(row[0]["unlimited_until"].replace("Z", "+00:00"))
-
-
 def grant_purchase(
     tg_id: int,
     payload: str,
@@ -46,11 +32,8 @@ def grant_purchase(
         return {"ok": True, "duplicate": True}
 
     if payload == payments.PACK10_PAYLOAD:
-        settings_row = db.ensure_user_settings(tg_id)
-        available = int(settings_row.get("paid_packs_available", 0)) + 1
-        db.client.table("user_settings").update(
-            {"paid_packs_available": available, "updated_at": datetime.utcnow().isoformat()}
-        ).eq("tg_id", tg_id).execute()
+        # Atomic server-side increment: concurrent purchases can't lose a pack.
+        available = int(db.client.rpc("increment_paid_packs", {"p_tg": tg_id, "p_delta": 1}).execute().data)
         return {
             "ok": True,
             "type": payments.PACK10,
@@ -59,19 +42,7 @@ def grant_purchase(
             "is_test": is_test,
         }
 
-    now = datetime.now(timezone.utc)
-    current_until = _current_unlimited_until(tg_id)
-    start = current_until if current_until and current_until > now else now
-    new_until = start + timedelta(days=30)
-
-    db.client.table("subscriptions").upsert(
-        {
-            "tg_id": tg_id,
-            "unlimited_until": new_until.isoformat(),
-        },
-        on_conflict="tg_id",
-    ).execute()
-
+    new_until = grant_unlimited_days(tg_id, 30)
     return {
         "ok": True,
         "type": payments.UNLIMITED30,
@@ -85,19 +56,10 @@ def grant_unlimited_days(tg_id: int, days: int) -> datetime:
     if days < 1:
         raise ValueError("days must be >= 1")
 
-    now = datetime.now(timezone.utc)
-    current_until = _current_unlimited_until(tg_id)
-    start = current_until if current_until and current_until > now else now
-    new_until = start + timedelta(days=days)
-
-    db.client.table("subscriptions").upsert(
-        {
-            "tg_id": tg_id,
-            "unlimited_until": new_until.isoformat(),
-        },
-        on_conflict="tg_id",
-    ).execute()
-    return new_until
+    # greatest(current, now()) + days is computed in the upsert itself: one round-trip, no race.
+    new_until = db.client.rpc("extend_unlimited", {"p_tg": tg_id, "p_days": days}).execute().data
+    quiz.invalidate_unlimited(tg_id)
+    return datetime.fromisoformat(new_until)
 
 
 def revoke_unlimited(tg_id: int) -> datetime:
@@ -109,4 +71,5 @@ def revoke_unlimited(tg_id: int) -> datetime:
         },
         on_conflict="tg_id",
     ).execute()
+    quiz.invalidate_unlimited(tg_id)
     return now
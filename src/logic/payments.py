@@ -3,8 +3,6 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any
 
-from postgrest.exceptions import APIError
-
 from src.db import db
 
 
@@ -16,6 +14,10 @@ PAYLOAD_TO_KIND = {
     PACK10_PAYLOAD: PACK10,
     UNLIMITED30_PAYLOAD: UNLIMITED30,
 }
+RECENT_CHARGE_IDS_MAX_SIZE = 4096
+
+# Charge ids already recorded by this process; a repeat can skip the DB round-trip.
+_recent_charge_ids: set[str] = set()
 
 
 def payload_for_kind(kind: str) -> str:
@@ -38,23 +40,24 @@ def insert_payment_if_new(
     invoice_payload: str,
     telegram_payment_charge_id: str,
 ) -> bool:
-    try:
-        db.client.table("payments").insert(
-            {
-                "tg_id": tg_id,
-                "provider": "telegram_stars",
-                "currency": currency,
-                "total_amount": total_amount,
-                "invoice_payload": invoice_payload,
-                "telegram_payment_charge_id": telegram_payment_charge_id,
-            }
-        ).execute()
-        return True
-    except APIError as exc:
-        details = f"{exc.message} {exc.details}"
-        if "payments_telegram_payment_charge_id_key" in details or "duplicate key" in details:
-            return False
-        raise
+    if telegram_payment_charge_id in _recent_charge_ids:
+        return False
+
+    # insert ... on conflict do nothing: the function reports whether a row was written.
+    is_new = db.client.rpc(
+        "insert_payment_if_new",
+        {
+            "p_tg": tg_id,
+            "p_currency": currency,
+            "p_total_amount": total_amount,
+            "p_invoice_payload": invoice_payload,
+            "p_charge_id": telegram_payment_charge_id,
+        },
+    ).execute().data
+    if len(_recent_charge_ids) >= RECENT_CHARGE_IDS_MAX_SIZE:
+        _recent_charge_ids.clear()
+    _recent_charge_ids.add(telegram_payment_charge_id)
+    return bool(is_new)
 
 
 def get_user_purchases_summary(tg_id: int) -> dict[str, Any]:
@@ -71,7 +74,7 @@ def get_user_purchases_summary(tg_id: int) -> dict[str, Any]:
     )
     unlimited_until = None
     if sub_row and sub_row[0].get("unlimited_until"):
-        unlimited_until = datetime.fromisoformat(sub_row[0]["unlimited_until"].replace("Z", "+00:00"))
+        unlimited_until = datetime.fromisoformat(sub_row[0]["unlimited_until"])
 
     recent = (
         db.client.table("payments")
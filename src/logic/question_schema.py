@@ -6,58 +6,81 @@ from typing import Any, Mapping
 
 logger = logging.getLogger(__name__)
 
+# Row columns carried over as-is; everything else in the payload is covered by the canonical keys.
+PASSTHROUGH_KEYS = ("id", "topic_id", "difficulty", "is_active")
+# Canonical field -> payload keys to try, in order of preference; the first non-empty value wins.
+FIELD_ALIASES = (
+    ("text", ("text", "q")),
+    ("a1", ("option1", "a1")),
+    ("a2", ("option2", "a2")),
+    ("a3", ("option3", "a3")),
+    ("a4", ("option4", "a4")),
+    ("correct", ("correct_option", "correct")),
+)
 
-def _first_non_empty(payload: Mapping[str, Any], *keys: str) -> Any:
-    for key in keys:
-        value = payload.get(key)
-        if value not in (None, ""):
-            return value
-    return None
+
+class NormalizedQuestion(dict):
+    # Marks output of normalize_question so passing it back in is a no-op.
+    __slots__ = ()
 
 
 def normalize_question(payload: Mapping[str, Any]) -> dict[str, Any] | None:
-    text = _first_non_empty(payload, "text", "q")
-    a1 = _first_non_empty(payload, "option1", "a1")
-    a2 = _first_non_empty(payload, "option2", "a2")
-    a3 = _first_non_empty(payload, "option3", "a3")
-    a4 = _first_non_empty(payload, "option4", "a4")
-    correct_raw = _first_non_empty(payload, "correct_option", "correct")
-
-    missing = [
-        name
-        for name, value in (("text", text), ("a1", a1), ("a2", a2), ("a3", a3), ("a4", a4), ("correct", correct_raw))
-        if value in (None, "")
-    ]
+    if isinstance(payload, NormalizedQuestion):
+        return payload
+
+    get = payload.get
+    values: list[Any] = []
+    missing: list[str] | None = None
+    for name, keys in FIELD_ALIASES:
+        value = None
+        for key in keys:
+            value = get(key)
+            if value not in (None, ""):
+                break
+        else:
+            if missing is None:
+                missing = []
+            missing.append(name)
+        values.append(value)
     if missing:
-        logger.warning("Question payload missing fields=%s keys=%s", ",".join(missing), sorted(payload.keys()))
+        if logger.isEnabledFor(logging.WARNING):
+            logger.warning("Question payload missing fields=%s keys=%s", ",".join(missing), sorted(payload))
         return None
 
+    text, a1, a2, a3, a4, correct_raw = values
     try:
         correct = int(correct_raw)
     except (TypeError, ValueError):
-        logger.warning("Question payload has invalid correct option=%r keys=%s", correct_raw, sorted(payload.keys()))
+        if logger.isEnabledFor(logging.WARNING):
+            logger.warning(
+                "Question payload has invalid correct option=%r keys=%s", correct_raw, sorted(payload)
+            )
         return None
 
     if correct < 1 or correct > 4:
-        logger.warning("Question payload has out-of-range correct option=%s keys=%s", correct, sorted(payload.keys()))
+        if logger.isEnabledFor(logging.WARNING):
+            logger.warning(
+                "Question payload has out-of-range correct option=%s keys=%s", correct, sorted(payload)
+            )
         return None
 
-    normalized: dict[str, Any] = dict(payload)
-    normalized.update(
-        {
-            "text": str(text),
-            "q": str(text),
-            "option1": str(a1),
-            "option2": str(a2),
-            "option3": str(a3),
-            "option4": str(a4),
-            "a1": str(a1),
-            "a2": str(a2),
-            "a3": str(a3),
-            "a4": str(a4),
-            "correct_option": correct,
-            "correct": correct,
-        }
+    text = str(text)
+    a1, a2, a3, a4 = str(a1), str(a2), str(a3), str(a4)
+    normalized = NormalizedQuestion(
+        text=text,
+        q=text,
+        option1=a1,
+        option2=a2,
+        option3=a3,
+        option4=a4,
+        a1=a1,
+        a2=a2,
+        a3=a3,
+        a4=a4,
+        correct_option=correct,
+        correct=correct,
     )
+    for key in PASSTHROUGH_KEYS:
+        if key in payload:
+            normalized[key] = payload[key]
     return normalized
-
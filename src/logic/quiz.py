@@ -2,8 +2,11 @@ from __future__ import annotations
 
 import random
 import logging
+from collections import OrderedDict
+from collections.abc import Collection
 from dataclasses import dataclass, field
-from datetime import datetime, time, timedelta
+from datetime import datetime, time, timedelta, timezone
+from time import monotonic
 from typing import Any
 
 import pytz
@@ -15,58 +18,85 @@ from src.logic.question_schema import normalize_question
 logger = logging.getLogger(__name__)
 
 DAILY_LIMIT = 10
+QUESTIONS_CACHE_TTL_SECONDS = 60.0
+PICK_SAMPLING_ATTEMPTS = 8
+PICK_SAMPLING_MAX_ASKED_SHARE = 0.8
+QUESTION_ROWS_CACHE_MAX_SIZE = 4096
+UNLIMITED_CACHE_TTL_SECONDS = 300.0
+UNLIMITED_CACHE_MAX_SIZE = 4096
+RUNTIME_SESSIONS_MAX_SIZE = 10_000
+ASKED_IDS_MAX_SIZE = 5000
+ASKED_IDS_KEEP = 2500
 
 
 @dataclass
 class RuntimeSession:
-    asked_ids: set[int] = field(default_factory=set)
+    # Insertion-ordered (values unused) so the oldest ids can be pruned first.
+    asked_ids: dict[int, None] = field(default_factory=dict)
     active_question_id: int | None = None
     answered_active: bool = False
 
 
-runtime_sessions: dict[int, RuntimeSession] = {}
+# LRU by last access: the least recently active user is evicted past RUNTIME_SESSIONS_MAX_SIZE.
+runtime_sessions: OrderedDict[int, RuntimeSession] = OrderedDict()
 
+# (mode, topic_id, difficulty) -> (loaded_at, active question ids)
+_questions_cache: dict[tuple[str, Any, Any], tuple[float, list[int]]] = {}
+# question id -> (loaded_at, normalized row or None when the row is missing or invalid)
+_question_rows_cache: dict[int, tuple[float, dict[str, Any] | None]] = {}
+_unlimited_cache: dict[int, tuple[float, datetime | None]] = {}
 
-def _today_str() -> str:
-    tz = pytz.timezone(settings.timezone)
-    return datetime.now(tz).date().isoformat()
+_TZ = pytz.timezone(settings.timezone)
+_today_cache: tuple[int, str] = (-1, "")
+
+
+def _now_local() -> datetime:
+    return datetime.now(_TZ)
+
+
+def today_str() -> str:
+    # Memoized per second of the monotonic clock; the date can't change any faster than that.
+    global _today_cache
+    bucket = int(monotonic())
+    if bucket != _today_cache[0]:
+        _today_cache = (bucket, _now_local().date().isoformat())
+    return _today_cache[1]
 
 
 def next_midnight_iso() -> str:
-    tz = pytz.timezone(settings.timezone)
-    now = datetime.now(tz)
+    now = _now_local()
     tomorrow = now.date() + timedelta(days=1)
-    midnight = tz.localize(datetime.combine(tomorrow, time.min))
+    midnight = _TZ.localize(datetime.combine(tomorrow, time.min))
     return midnight.isoformat()
 
 
-def get_or_create_session(tg_id: int) -> RuntimeSession:
-    if tg_id not in runtime_sessions:
-        runtime_sessions[tg_id] = RuntimeSession()
-    return runtime_sessions[tg_id]
+def _store_session(tg_id: int, session: RuntimeSession) -> RuntimeSession:
+    runtime_sessions[tg_id] = session
+    runtime_sessions.move_to_end(tg_id)
+    if len(runtime_sessions) > RUNTIME_SESSIONS_MAX_SIZE:
+        runtime_sessions.popitem(last=False)
+    return session
 
 
-def reset_session(tg_id: int) -> None:
-    runtime_sessions[tg_id] = RuntimeSession()
+def get_or_create_session(tg_id: int) -> RuntimeSession:
+    session = runtime_sessions.get(tg_id)
+    if session is None:
+        return _store_session(tg_id, RuntimeSession())
+    runtime_sessions.move_to_end(tg_id)
+    return session
 
 
-def ensure_day_row(tg_id: int, day: str | None = None) -> dict[str, Any]:
-    day = day or _today_str()
-    db.client.table("user_day").upsert(
-        {
-            "tg_id": tg_id,
-            "day": day,
-            "correct_count": 0,
-            "wrong_count": 0,
-            "streak_today": 0,
-            "is_blocked": False,
-        },
-        on_conflict="tg_id,day",
-    ).execute()
-    return db.client.table("user_day").select("*").eq("tg_id", tg_id).eq("day", day).single().execute().data
+def reset_session(tg_id: int) -> None:
+    _store_session(tg_id, RuntimeSession())
 
 
 def get_unlimited_until(tg_id: int) -> datetime | None:
+    # The expiry itself is compared live in has_unlimited_now, so a cached value can't outlive it.
+    now = monotonic()
+    cached = _unlimited_cache.get(tg_id)
+    if cached is not None and now - cached[0] < UNLIMITED_CACHE_TTL_SECONDS:
+        return cached[1]
+
     row = (
         db.client.table("subscriptions")
         .select("unlimited_until")
@@ -75,58 +105,124 @@ def get_unlimited_until(tg_id: int) -> datetime | None:
         .execute()
         .data
     )
-    if not row:
-        return None
-    value = row[0].get("unlimited_until")
-    if not value:
-        return None
-    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    value = row[0].get("unlimited_until") if row else None
+    return remember_unlimited_until(tg_id, value)
+
+
+def remember_unlimited_until(tg_id: int, value: str | None) -> datetime | None:
+    # Also fed from record_answer/user_profile results, which already carry unlimited_until.
+    until = datetime.fromisoformat(value) if value else None
+    if len(_unlimited_cache) >= UNLIMITED_CACHE_MAX_SIZE:
+        _unlimited_cache.clear()
+    _unlimited_cache[tg_id] = (monotonic(), until)
+    return until
+
+
+def invalidate_unlimited(tg_id: int) -> None:
+    _unlimited_cache.pop(tg_id, None)
 
 
 def has_unlimited_now(tg_id: int) -> bool:
     until = get_unlimited_until(tg_id)
-    return bool(until and until > datetime.utcnow().astimezone(until.tzinfo))
+    return bool(until and until > datetime.now(timezone.utc))
 
 
 def get_settings(tg_id: int) -> dict[str, Any]:
     return db.ensure_user_settings(tg_id)
 
 
-def _query_questions(settings_row: dict[str, Any]) -> list[dict[str, Any]]:
-    query = db.client.table("questions").select("*").eq("is_active", True)
+def set_mode(tg_id: int, mode: str, *, topic_id: int | None = None, difficulty: int | None = None) -> None:
+    db.client.table("user_settings").update(
+        {"mode": mode, "topic_id": topic_id, "difficulty": difficulty}
+    ).eq("tg_id", tg_id).execute()
+
+
+def _query_question_ids(settings_row: dict[str, Any]) -> list[int]:
+    # Only ids are needed to sample; the full row is fetched for the one question that gets picked.
+    query = db.client.table("questions").select("id").eq("is_active", True)
     mode = settings_row.get("mode", "random")
     if mode == "topic" and settings_row.get("topic_id"):
         query = query.eq("topic_id", settings_row["topic_id"])
     elif mode == "difficulty" and settings_row.get("difficulty"):
         query = query.eq("difficulty", settings_row["difficulty"])
-    return query.limit(2000).execute().data or []
+    return [row["id"] for row in query.limit(2000).execute().data or []]
+
+
+def _active_question_ids(settings_row: dict[str, Any]) -> list[int]:
+    key = (settings_row.get("mode", "random"), settings_row.get("topic_id"), settings_row.get("difficulty"))
+    now = monotonic()
+    cached = _questions_cache.get(key)
+    if cached is not None and now - cached[0] < QUESTIONS_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    question_ids = _query_question_ids(settings_row)
+    _questions_cache[key] = (now, question_ids)
+    return question_ids
+
+
+def bust_questions_cache() -> None:
+    _questions_cache.clear()
+    _question_rows_cache.clear()
+
+
+def _sample_unasked(question_ids: list[int], asked_ids: Collection[int]) -> int:
+    # Rejection sampling is O(1) expected while most of the pool is unasked;
+    # near exhaustion fall back to scanning for the remaining questions.
+    if len(asked_ids) < PICK_SAMPLING_MAX_ASKED_SHARE * len(question_ids):
+        for _ in range(PICK_SAMPLING_ATTEMPTS):
+            candidate = question_ids[random.randrange(len(question_ids))]
+            if candidate not in asked_ids:
+                return candidate
+
+    not_used = [qid for qid in question_ids if qid not in asked_ids]
+    return random.choice(not_used if not_used else question_ids)
 
 
 def pick_question(tg_id: int) -> dict[str, Any] | None:
     session = get_or_create_session(tg_id)
     settings_row = get_settings(tg_id)
-    questions = _query_questions(settings_row)
-    if not questions:
-        return None
-    normalized_questions = [q for q in (normalize_question(item) for item in questions) if q is not None]
-    if not normalized_questions:
+    pool = _active_question_ids(settings_row)
+    question_ids = pool
+    question = None
+    while question_ids:
+        question_id = _sample_unasked(question_ids, session.asked_ids)
+        question = get_question_by_id(question_id)
+        if question is not None:
+            break
+        # The cached pool is shared between worker threads, so invalid ids are pruned from a private copy;
+        # get_question_by_id caches the miss, so later picks skip the row without another query.
+        if question_ids is pool:
+            question_ids = list(pool)
+        question_ids.remove(question_id)
+    if question is None:
         logger.warning("No valid questions after normalization for tg_id=%s", tg_id)
         return None
 
-    not_used = [q for q in normalized_questions if q["id"] not in session.asked_ids]
-    pool = not_used if not_used else normalized_questions
-    question = random.choice(pool)
-    session.asked_ids.add(question["id"])
+    session.asked_ids[question["id"]] = None
+    if len(session.asked_ids) > ASKED_IDS_MAX_SIZE:
+        session.asked_ids = dict.fromkeys(list(session.asked_ids)[-ASKED_IDS_KEEP:])
     session.active_question_id = question["id"]
     session.answered_active = False
     return question
 
 
-def can_start_quiz_now(tg_id: int) -> tuple[bool, str | None]:
-    if has_unlimited_now(tg_id):
+def can_start_quiz_now(tg_id: int, has_unlimited: bool | None = None) -> tuple[bool, str | None]:
+    if has_unlimited is None:
+        has_unlimited = has_unlimited_now(tg_id)
+    if has_unlimited:
         return True, None
 
-    day_row = ensure_day_row(tg_id)
+    # Read-only: a missing day row means nothing has been answered today, so there is nothing to create here.
+    rows = (
+        db.client.table("user_day")
+        .select("is_blocked,correct_count")
+        .eq("tg_id", tg_id)
+        .eq("day", today_str())
+        .limit(1)
+        .execute()
+        .data
+    )
+    day_row = rows[0] if rows else {}
     if day_row.get("is_blocked"):
         return False, "На сегодня достаточно. Отдыхай до завтра 😴"
     if int(day_row.get("correct_count", 0)) >= DAILY_LIMIT:
@@ -134,22 +230,22 @@ def can_start_quiz_now(tg_id: int) -> tuple[bool, str | None]:
     return True, None
 
 
-def _build_answer_payload(
+def _record_answer_params(
     *,
     tg_id: int,
     question_id: int,
     answer_index: int,
     is_correct: bool,
     day: str,
+    answered_at: str,
 ) -> dict[str, Any]:
-    tz = pytz.timezone(settings.timezone)
     return {
-        "tg_id": tg_id,
-        "day": day,
-        "question_id": question_id,
-        "chosen": answer_index,
-        "is_correct": is_correct,
-        "answered_at": datetime.now(tz).isoformat(),
+        "p_tg_id": tg_id,
+        "p_question_id": question_id,
+        "p_chosen": answer_index,
+        "p_is_correct": is_correct,
+        "p_day": day,
+        "p_answered_at": answered_at,
     }
 
 
@@ -167,56 +263,32 @@ def save_answer(tg_id: int, question: dict[str, Any], answer_index: int) -> tupl
 
     correct = int(normalized_question["correct"])
     is_correct = answer_index == correct
-    day = _today_str()
-    payload = _build_answer_payload(
+    # One clock read per answer: the day bucket and answered_at come from the same instant.
+    now = _now_local()
+    params = _record_answer_params(
         tg_id=tg_id,
         question_id=question["id"],
         answer_index=answer_index,
         is_correct=is_correct,
-        day=day,
+        day=now.date().isoformat(),
+        answered_at=now.isoformat(),
     )
+    # record_answer inserts the answer and updates user_day and users in one transaction.
     try:
-        db.client.table("answers").insert(payload).execute()
+        result = db.client.rpc("record_answer", params).execute().data
     except Exception as exc:
         logger.exception(
-            "Failed to insert answer for tg_id=%s question_id=%s payload_keys=%s error=%s",
+            "Failed to record answer for tg_id=%s question_id=%s error=%s",
             tg_id,
             question.get("id"),
-            sorted(payload.keys()),
             exc,
         )
         return False, "save_failed"
 
-    day_row = ensure_day_row(tg_id)
-    unlimited = has_unlimited_now(tg_id)
-    updates = {
-        "correct_count": int(day_row.get("correct_count", 0)) + (1 if is_correct else 0),
-        "wrong_count": int(day_row.get("wrong_count", 0)) + (0 if is_correct else 1),
-    }
-    if is_correct:
-        updates["streak_today"] = int(day_row.get("streak_today", 0)) + 1
-    elif not unlimited:
-        updates["is_blocked"] = True
-        updates["streak_today"] = 0
-    db.client.table("user_day").update(updates).eq("tg_id", tg_id).eq("day", day).execute()
-
-    stats = db.client.table("users").select("total_answers,total_correct,total_wrong,best_streak").eq("tg_id", tg_id).single().execute().data
-    best_streak = int(stats.get("best_streak", 0))
-    today_streak = int(updates.get("streak_today", day_row.get("streak_today", 0)))
-    if today_streak > best_streak:
-        best_streak = today_streak
-
-    db.client.table("users").update(
-        {
-            "total_answers": int(stats.get("total_answers", 0)) + 1,
-            "total_correct": int(stats.get("total_correct", 0)) + (1 if is_correct else 0),
-            "total_wrong": int(stats.get("total_wrong", 0)) + (0 if is_correct else 1),
-            "best_streak": best_streak,
-        }
-    ).eq("tg_id", tg_id).execute()
-
     session.answered_active = True
-    if is_correct and (not unlimited) and updates["correct_count"] >= DAILY_LIMIT:
+    remember_unlimited_until(tg_id, result.get("unlimited_until"))
+    unlimited = bool(result.get("unlimited"))
+    if is_correct and (not unlimited) and int(result.get("correct_count", 0)) >= DAILY_LIMIT:
         return True, "daily_done"
     if (not is_correct) and (not unlimited):
         return True, "blocked"
@@ -224,7 +296,14 @@ def save_answer(tg_id: int, question: dict[str, Any], answer_index: int) -> tupl
 
 
 def get_question_by_id(question_id: int) -> dict[str, Any] | None:
+    now = monotonic()
+    cached = _question_rows_cache.get(question_id)
+    if cached is not None and now - cached[0] < QUESTIONS_CACHE_TTL_SECONDS:
+        return cached[1]
+
     rows = db.client.table("questions").select("*").eq("id", question_id).limit(1).execute().data
-    if not rows:
-        return None
-    return normalize_question(rows[0])
+    question = normalize_question(rows[0]) if rows else None
+    if len(_question_rows_cache) >= QUESTION_ROWS_CACHE_MAX_SIZE:
+        _question_rows_cache.clear()
+    _question_rows_cache[question_id] = (now, question)
+    return question
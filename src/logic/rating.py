@@ -1,20 +1,31 @@
 from __future__ import annotations
 
+import time
+
 from src.db import db
-from src.logic.quiz import ensure_day_row, get_unlimited_until
+from src.logic.quiz import remember_unlimited_until, today_str
+
+LEADERBOARD_CACHE_TTL_SECONDS = 30.0
+RANKS_REFRESH_INTERVAL_SECONDS = 60.0
+
+# users_ranked column holding the precomputed position for each leaderboard metric.
+_RANK_COLUMNS = {"total_correct": "rank_correct", "best_streak": "rank_streak"}
+
+_top10_cache: dict[str, tuple[float, list[dict]]] = {}
 
 
 def user_stats(tg_id: int) -> dict:
-    user = db.client.table("users").select("total_answers,total_correct,total_wrong,best_streak").eq("tg_id", tg_id).single().execute().data
-    day = ensure_day_row(tg_id)
+    # users, today's user_day (created if missing) and subscriptions come back from one call.
+    profile = db.client.rpc("user_profile", {"p_tg_id": tg_id, "p_day": today_str()}).execute().data or {}
+    unlimited_until = remember_unlimited_until(tg_id, profile.get("unlimited_until"))
     return {
-        "total_answers": int(user.get("total_answers", 0)),
-        "total_correct": int(user.get("total_correct", 0)),
-        "total_wrong": int(user.get("total_wrong", 0)),
-        "best_streak": int(user.get("best_streak", 0)),
-        "streak_today": int(day.get("streak_today", 0)),
-        "correct_today": int(day.get("correct_count", 0)),
-        "unlimited_until": get_unlimited_until(tg_id),
+        "total_answers": int(profile.get("total_answers") or 0),
+        "total_correct": int(profile.get("total_correct") or 0),
+        "total_wrong": int(profile.get("total_wrong") or 0),
+        "best_streak": int(profile.get("best_streak") or 0),
+        "streak_today": int(profile.get("streak_today") or 0),
+        "correct_today": int(profile.get("correct_today") or 0),
+        "unlimited_until": unlimited_until,
     }
 
 
@@ -22,7 +33,13 @@ def top10(metric: str) -> list[dict]:
     if metric not in {"total_correct", "best_streak"}:
         raise ValueError("Unsupported leaderboard metric")
 
-    return (
+    # Leaderboards move slowly; serve a recent copy instead of re-sorting users per viewer.
+    now = time.monotonic()
+    cached = _top10_cache.get(metric)
+    if cached is not None and now - cached[0] < LEADERBOARD_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    rows = (
         db.client.table("users")
         .select("tg_id,first_name,username,total_correct,best_streak")
         .order(metric, desc=True)
@@ -31,39 +48,22 @@ def top10(metric: str) -> list[dict]:
         .execute()
         .data
     ) or []
+    _top10_cache[metric] = (now, rows)
+    return rows
 
 
 def user_rank(tg_id: int, metric: str) -> int:
-    if metric not in {"total_correct", "best_streak"}:
+    column = _RANK_COLUMNS.get(metric)
+    if column is None:
         raise ValueError("Unsupported leaderboard metric")
 
-    user = (
-        db.client.table("users")
-        .select(f"tg_id,{metric}")
-        .eq("tg_id", tg_id)
-        .single()
-        .execute()
-        .data
-    )
-    user_value = int((user or {}).get(metric, 0))
-
-    better_count = (
-        db.client.table("users")
-        .select("tg_id", count="exact")
-        .gt(metric, user_value)
-        .execute()
-        .count
-        or 0
-    )
+    # Indexed lookup in the periodically refreshed users_ranked view (same ordering as top10).
+    rows = db.client.table("users_ranked").select(column).eq("tg_id", tg_id).limit(1).execute().data
+    if rows:
+        return int(rows[0][column])
+    # Users created since the last refresh are not in the view yet; count them live.
+    return int(db.client.rpc("user_rank", {"p_tg_id": tg_id, "p_metric": metric}).execute().data)
 
-    same_with_lower_id = (
-        db.client.table("users")
-        .select("tg_id", count="exact")
-        .eq(metric, user_value)
-        .lt("tg_id", tg_id)
-        .execute()
-        .count
-        or 0
-    )
 
-    return int(better_count + same_with_lower_id + 1)
+def refresh_ranks() -> None:
+    db.client.rpc("refresh_users_ranked", {}).execute()
@@ -1,7 +1,7 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
 
 
-def start_kb(has_unlimited: bool = False) -> ReplyKeyboardMarkup:
+def _build_start_kb(has_unlimited: bool) -> ReplyKeyboardMarkup:
     keyboard = [
         [KeyboardButton(text="Начать")],
         [KeyboardButton(text="Меню")],
@@ -14,78 +14,103 @@ def start_kb(has_unlimited: bool = False) -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
 
+_START_KB_BASIC = _build_start_kb(False)
+_START_KB_UNLIMITED = _build_start_kb(True)
+
+# Keyboards without per-call input are built once at import and shared.
+_NEXT_QUESTION_KB = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="Следующий", callback_data="next")],
+        [InlineKeyboardButton(text="Меню", callback_data="menu")],
+    ]
+)
+_BUY_KB = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="Купить +10", callback_data="buy:pack10")],
+        [InlineKeyboardButton(text="Купить безлимит 30 дней", callback_data="buy:unlimited30")],
+    ]
+)
+_UNLIMITED_SETTINGS_KB = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="random", callback_data="setmode:random")],
+        [InlineKeyboardButton(text="topic", callback_data="setmode:topic")],
+        [InlineKeyboardButton(text="difficulty", callback_data="setmode:difficulty")],
+    ]
+)
+_RATING_TYPE_KB = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="Всего верных", callback_data="rating:total_correct")],
+        [InlineKeyboardButton(text="Лучшая серия", callback_data="rating:best_streak")],
+    ]
+)
+_ADMIN_MENU_KB = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="Добавить вопрос", callback_data="admin:add_question")],
+        [InlineKeyboardButton(text="Импорт вопросов (пачкой)", callback_data="admin:bulk_import")],
+        [InlineKeyboardButton(text="Импорт вопросов (файлом)", callback_data="admin:file_import")],
+        [InlineKeyboardButton(text="Список последних 10 вопросов", callback_data="admin:list_questions")],
+        [InlineKeyboardButton(text="Включить/выключить вопрос", callback_data="admin:toggle_question")],
+        [InlineKeyboardButton(text="Выдать админку", callback_data="admin:grant_admin")],
+        [InlineKeyboardButton(text="Выдать безлимит", callback_data="admin:grant_unlimited")],
+        [InlineKeyboardButton(text="Снять безлимит", callback_data="admin:revoke_unlimited")],
+    ]
+)
+# Shared by every answers keyboard; only the ans:<id>:<n> buttons change per question.
+_MENU_ROW = [InlineKeyboardButton(text="Меню", callback_data="menu")]
+_ANS_TEXTS = ("Ответить: 1", "Ответить: 2", "Ответить: 3", "Ответить: 4")
+ANSWERS_KB_CACHE_MAX_SIZE = 4096
+# question_id -> answers keyboard; aiogram only serializes markups, so sharing an instance is safe.
+_answers_kb_cache: dict[int, InlineKeyboardMarkup] = {}
+_ADMIN_UNLIMITED_DAYS_KB = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="30 дней", callback_data="admin:grant_unlimited_days:30")],
+        [InlineKeyboardButton(text="7 дней", callback_data="admin:grant_unlimited_days:7")],
+        [InlineKeyboardButton(text="1 день", callback_data="admin:grant_unlimited_days:1")],
+        [InlineKeyboardButton(text="Ввести вручную", callback_data="admin:grant_unlimited_days:manual")],
+    ]
+)
+
+
+def start_kb(has_unlimited: bool = False) -> ReplyKeyboardMarkup:
+    return _START_KB_UNLIMITED if has_unlimited else _START_KB_BASIC
+
+
 def answers_kb(question_id: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="Ответить: 1", callback_data=f"ans:{question_id}:1")],
-            [InlineKeyboardButton(text="Ответить: 2", callback_data=f"ans:{question_id}:2")],
-            [InlineKeyboardButton(text="Ответить: 3", callback_data=f"ans:{question_id}:3")],
-            [InlineKeyboardButton(text="Ответить: 4", callback_data=f"ans:{question_id}:4")],
-            [InlineKeyboardButton(text="Меню", callback_data="menu")],
-        ]
-    )
+    keyboard = _answers_kb_cache.get(question_id)
+    if keyboard is not None:
+        return keyboard
+
+    prefix = f"ans:{question_id}:"
+    rows = [[InlineKeyboardButton(text=text, callback_data=f"{prefix}{i}")] for i, text in enumerate(_ANS_TEXTS, 1)]
+    rows.append(_MENU_ROW)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=rows)
+    if len(_answers_kb_cache) >= ANSWERS_KB_CACHE_MAX_SIZE:
+        _answers_kb_cache.clear()
+    _answers_kb_cache[question_id] = keyboard
+    return keyboard
 
 
 def next_question_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="Следующий", callback_data="next")],
-            [InlineKeyboardButton(text="Меню", callback_data="menu")],
-        ]
-    )
+    return _NEXT_QUESTION_KB
 
 
 def buy_kb(monetization_enabled: bool = True) -> InlineKeyboardMarkup | None:
     if not monetization_enabled:
         return None
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="Купить +10", callback_data="buy:pack10")],
-            [InlineKeyboardButton(text="Купить безлимит 30 дней", callback_data="buy:unlimited30")],
-        ]
-    )
+    return _BUY_KB
 
 
 def unlimited_settings_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="random", callback_data="setmode:random")],
-            [InlineKeyboardButton(text="topic", callback_data="setmode:topic")],
-            [InlineKeyboardButton(text="difficulty", callback_data="setmode:difficulty")],
-        ]
-    )
+    return _UNLIMITED_SETTINGS_KB
 
 
 def rating_type_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="Всего верных", callback_data="rating:total_correct")],
-            [InlineKeyboardButton(text="Лучшая серия", callback_data="rating:best_streak")],
-        ]
-    )
+    return _RATING_TYPE_KB
 
 
 def admin_menu_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="Добавить вопрос", callback_data="admin:add_question")],
-            [InlineKeyboardButton(text="Импорт вопросов (пачкой)", callback_data="admin:bulk_import")],
-            [InlineKeyboardButton(text="Импорт вопросов (файлом)", callback_data="admin:file_import")],
-            [InlineKeyboardButton(text="Список последних 10 вопросов", callback_data="admin:list_questions")],
-            [InlineKeyboardButton(text="Включить/выключить вопрос", callback_data="admin:toggle_question")],
-            [InlineKeyboardButton(text="Выдать админку", callback_data="admin:grant_admin")],
-            [InlineKeyboardButton(text="Выдать безлимит", callback_data="admin:grant_unlimited")],
-            [InlineKeyboardButton(text="Снять безлимит", callback_data="admin:revoke_unlimited")],
-        ]
-    )
+    return _ADMIN_MENU_KB
 
 
 def admin_unlimited_days_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="30 дней", callback_data="admin:grant_unlimited_days:30")],
-            [InlineKeyboardButton(text="7 дней", callback_data="admin:grant_unlimited_days:7")],
-            [InlineKeyboardButton(text="1 день", callback_data="admin:grant_unlimited_days:1")],
-            [InlineKeyboardButton(text="Ввести вручную", callback_data="admin:grant_unlimited_days:manual")],
-        ]
-    )
+    return _ADMIN_UNLIMITED_DAYS_KB
@@ -1,4 +1,5 @@
 import logging
+from time import monotonic
 
 from src.logic.question_schema import normalize_question
 
@@ -12,17 +13,37 @@ WRONG_STOP = "Есть ошибка — отдыхай до завтра 😴"
 NO_QUESTIONS = "Пока нет подходящих вопросов."
 QUESTION_FORMAT_ERROR = "Ошибка формата вопроса"
 
+QUESTION_TEMPLATE = "<b>%s</b>\n\n1) %s\n2) %s\n3) %s\n4) %s"
+
+QUESTION_TEXT_CACHE_TTL_SECONDS = 60.0
+QUESTION_TEXT_CACHE_MAX_SIZE = 4096
+
+# question id -> (rendered_at, text); the same question is served to many users in a row.
+_question_text_cache: dict[int, tuple[float, str]] = {}
+
 
 def question_text(question: dict) -> str:
+    question_id = question.get("id")
+    now = monotonic()
+    cached = _question_text_cache.get(question_id)
+    if cached is not None and now - cached[0] < QUESTION_TEXT_CACHE_TTL_SECONDS:
+        return cached[1]
+
     normalized = normalize_question(question)
     if normalized is None:
-        logger.warning("Invalid question payload in question_text: keys=%s", sorted(question.keys()))
+        if logger.isEnabledFor(logging.WARNING):
+            logger.warning("Invalid question payload in question_text: keys=%s", sorted(question))
         return QUESTION_FORMAT_ERROR
 
-    return (
-        f"<b>{normalized['text']}</b>\n\n"
-        f"1) {normalized['a1']}\n"
-        f"2) {normalized['a2']}\n"
-        f"3) {normalized['a3']}\n"
-        f"4) {normalized['a4']}"
+    text = QUESTION_TEMPLATE % (
+        normalized["text"],
+        normalized["a1"],
+        normalized["a2"],
+        normalized["a3"],
+        normalized["a4"],
     )
+    if question_id is not None:
+        if len(_question_text_cache) >= QUESTION_TEXT_CACHE_MAX_SIZE:
+            _question_text_cache.clear()
+        _question_text_cache[question_id] = (now, text)
+    return text
@@ -3,9 +3,9 @@ import unittest
 
 os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
 os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
-os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service-role-key")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.test")
 
-from src.logic.bulk_import import parse_bulk_block, split_bulk_blocks
+from src.logic.bulk_import import parse_bulk_block, parse_bulk_blocks, split_bulk_blocks
 
 
 class BulkImportParsingTest(unittest.TestCase):
@@ -24,6 +24,26 @@ class BulkImportParsingTest(unittest.TestCase):
         self.assertTrue(blocks[0].startswith("Q: First?"))
         self.assertTrue(blocks[1].startswith("Q: Second?"))
 
+    def test_split_by_separator_with_blank_lines_and_crlf(self):
+        raw = (
+            "Q: First?\r\n"
+            "A) 1\r\nB) 2\r\nC) 3\r\nD) 4\r\n"
+            "ANS: B\r\n"
+            "\r\n"
+            "  ---  \r\n"
+            "---\r\n"
+            "\r\n"
+            "Q: Second?\r\n"
+            "A) aa\r\nB) bb\r\nC) cc\r\nD) dd\r\n"
+            "ANS: D\r\n"
+            "---"
+        )
+        blocks = split_bulk_blocks(raw)
+        self.assertEqual(len(blocks), 2)
+        self.assertTrue(blocks[0].startswith("Q: First?"))
+        self.assertTrue(blocks[0].endswith("ANS: B"))
+        self.assertTrue(blocks[1].startswith("Q: Second?"))
+
     def test_split_without_separator_on_q_boundary(self):
         raw = (
             "Q: First?\n"
@@ -56,6 +76,32 @@ class BulkImportParsingTest(unittest.TestCase):
         self.assertEqual(parsed["difficulty"], 2)
         self.assertFalse(parsed["is_active"])
 
+    def test_parse_block_accepts_mixed_option_spellings(self):
+        block = "Q: Mixed?\na) one\nB ) two\nC: three\nD)four\nANS: d"
+        parsed = parse_bulk_block(block)
+        self.assertEqual(
+            (parsed["a1"], parsed["a2"], parsed["a3"], parsed["a4"]),
+            ("one", "two", "three", "four"),
+        )
+        self.assertEqual(parsed["correct"], 4)
+
+    def test_parse_block_rejects_option_without_text(self):
+        with self.assertRaises(ValueError):
+            parse_bulk_block("Q: Empty?\nA)\nB) 2\nC) 3\nD) 4\nANS: A")
+
+    def test_parse_blocks_collects_payloads_and_numbered_errors(self):
+        raw = (
+            "Q: First?\nA) 1\nB) 2\nC) 3\nD) 4\nANS: B\n"
+            "---\n"
+            "Q: Broken?\nA) 1\nB) 2\nC) 3\nANS: A\n"
+            "---\n"
+            "Q: Third?\nA) 1\nB) 2\nC) 3\nD) 4\nANS: C"
+        )
+        payloads, errors = parse_bulk_blocks(raw)
+        self.assertEqual([payload["q"] for payload in payloads], ["First?", "Third?"])
+        self.assertEqual(errors, ["Блок 2: отсутствует вариант D"])
+        self.assertEqual(parse_bulk_blocks("   "), ([], []))
+
 
 if __name__ == "__main__":
     unittest.main()
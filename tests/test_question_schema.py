@@ -36,6 +36,47 @@ class NormalizeQuestionTest(unittest.TestCase):
         self.assertEqual(normalized["a3"], "C")
         self.assertEqual(normalized["correct"], 3)
 
+    def test_keeps_row_fields_and_drops_unknown_columns(self):
+        payload = {
+            "id": 4,
+            "q": "Q?",
+            "a1": "A",
+            "a2": "B",
+            "a3": "C",
+            "a4": "D",
+            "correct": 1,
+            "topic_id": 7,
+            "difficulty": 2,
+            "is_active": False,
+            "created_at": "2024-01-01T00:00:00+00:00",
+        }
+        normalized = normalize_question(payload)
+        self.assertEqual(normalized["id"], 4)
+        self.assertEqual(normalized["topic_id"], 7)
+        self.assertEqual(normalized["difficulty"], 2)
+        self.assertFalse(normalized["is_active"])
+        self.assertNotIn("created_at", normalized)
+        self.assertIs(normalize_question(normalized), normalized)
+        self.assertEqual(normalize_question(dict(normalized)), normalized)
+
+    def test_falls_back_to_next_alias_when_first_is_empty(self):
+        payload = {
+            "id": 5,
+            "text": "",
+            "q": "Q?",
+            "option1": "A",
+            "a1": "ignored",
+            "a2": "B",
+            "a3": "C",
+            "a4": "D",
+            "correct_option": None,
+            "correct": 4,
+        }
+        normalized = normalize_question(payload)
+        self.assertEqual(normalized["text"], "Q?")
+        self.assertEqual(normalized["a1"], "A")
+        self.assertEqual(normalized["correct"], 4)
+
     def test_rejects_incomplete_payload(self):
         payload = {"id": 3, "q": "Q only"}
         self.assertIsNone(normalize_question(payload))
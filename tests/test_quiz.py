@@ -0,0 +1,157 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.test")
+
+from src.logic import quiz
+
+
+class _FakeQuery:
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+
+    def select(self, *_args, **_kwargs):
+        return self
+
+    def eq(self, column: str, value):
+        return _FakeQuery([row for row in self.rows if row.get(column) == value])
+
+    def limit(self, count: int):
+        return _FakeQuery(self.rows[:count])
+
+    def execute(self):
+        return SimpleNamespace(data=self.rows)
+
+
+class _FakeClient:
+    def __init__(self, tables: dict[str, list[dict]], rpc_results: dict[str, object]):
+        self.tables = tables
+        self.rpc_results = rpc_results
+        self.rpc_calls: list[tuple[str, dict]] = []
+
+    def table(self, name: str) -> _FakeQuery:
+        return _FakeQuery(self.tables.get(name, []))
+
+    def rpc(self, name: str, params: dict):
+        self.rpc_calls.append((name, params))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=self.rpc_results[name]))
+
+
+class _FakeDb:
+    def __init__(self, tables: dict[str, list[dict]] | None = None, rpc_results: dict[str, object] | None = None):
+        self.client = _FakeClient(tables or {}, rpc_results or {})
+
+    def ensure_user_settings(self, tg_id: int) -> dict:
+        return {"tg_id": tg_id, "mode": "random", "topic_id": None, "difficulty": None}
+
+
+def _question_row(question_id: int, **overrides) -> dict:
+    row = {
+        "id": question_id,
+        "q": f"Q{question_id}?",
+        "a1": "A",
+        "a2": "B",
+        "a3": "C",
+        "a4": "D",
+        "correct": 2,
+        "is_active": True,
+    }
+    row.update(overrides)
+    return row
+
+
+class _QuizTestCase(unittest.TestCase):
+    def setUp(self):
+        quiz.runtime_sessions.clear()
+        quiz._questions_cache.clear()
+        quiz._question_rows_cache.clear()
+        quiz._unlimited_cache.clear()
+
+    def use_db(self, fake_db: _FakeDb) -> _FakeDb:
+        patcher = mock.patch.object(quiz, "db", fake_db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return fake_db
+
+
+class SaveAnswerTest(_QuizTestCase):
+    TG_ID = 100
+
+    def _answer(self, answer_index: int, **result) -> tuple[bool, str]:
+        record = {"correct_count": 0, "streak_today": 0, "is_blocked": False, "unlimited": False, "unlimited_until": None}
+        record.update(result)
+        self.use_db(_FakeDb(rpc_results={"record_answer": record}))
+        question = quiz.normalize_question(_question_row(7))
+        quiz.get_or_create_session(self.TG_ID).active_question_id = 7
+        return quiz.save_answer(self.TG_ID, question, answer_index)
+
+    def test_tenth_correct_answer_is_daily_done(self):
+        self.assertEqual(self._answer(2, correct_count=quiz.DAILY_LIMIT), (True, "daily_done"))
+
+    def test_correct_answer_below_limit(self):
+        self.assertEqual(self._answer(2, correct_count=3), (True, "correct"))
+
+    def test_wrong_answer_without_unlimited_blocks(self):
+        self.assertEqual(self._answer(1), (True, "blocked"))
+
+    def test_unlimited_answers_are_never_capped(self):
+        self.assertEqual(self._answer(2, correct_count=quiz.DAILY_LIMIT, unlimited=True), (True, "correct"))
+        quiz.reset_session(self.TG_ID)
+        self.assertEqual(self._answer(1, unlimited=True), (True, "wrong"))
+
+    def test_second_answer_to_same_question_is_rejected(self):
+        self._answer(2, correct_count=1)
+        question = quiz.normalize_question(_question_row(7))
+        self.assertEqual(quiz.save_answer(self.TG_ID, question, 2), (False, "already_answered"))
+
+    def test_passes_answer_to_record_answer(self):
+        self._answer(1)
+        name, params = quiz.db.client.rpc_calls[0]
+        self.assertEqual(name, "record_answer")
+        self.assertEqual(params["p_tg_id"], self.TG_ID)
+        self.assertEqual(params["p_question_id"], 7)
+        self.assertEqual(params["p_chosen"], 1)
+        self.assertFalse(params["p_is_correct"])
+
+
+class SampleUnaskedTest(unittest.TestCase):
+    def test_skips_asked_ids(self):
+        for _ in range(50):
+            self.assertEqual(quiz._sample_unasked([1, 2, 3], {1: None, 3: None}), 2)
+
+    def test_returns_from_full_pool_when_everything_was_asked(self):
+        self.assertIn(quiz._sample_unasked([1, 2], {1: None, 2: None}), {1, 2})
+
+
+class PickQuestionTest(_QuizTestCase):
+    TG_ID = 200
+
+    def test_picks_valid_question_and_marks_it_asked(self):
+        self.use_db(_FakeDb(tables={"questions": [_question_row(1), _question_row(2)]}))
+        question = quiz.pick_question(self.TG_ID)
+        session = quiz.runtime_sessions[self.TG_ID]
+        self.assertIn(question["id"], {1, 2})
+        self.assertEqual(session.active_question_id, question["id"])
+        self.assertIn(question["id"], session.asked_ids)
+        self.assertFalse(session.answered_active)
+
+    def test_skips_invalid_rows_without_mutating_cached_pool(self):
+        self.use_db(_FakeDb(tables={"questions": [_question_row(1, a3=""), _question_row(2)]}))
+        for _ in range(10):
+            quiz.reset_session(self.TG_ID)
+            self.assertEqual(quiz.pick_question(self.TG_ID)["id"], 2)
+        cached_pools = [ids for _, ids in quiz._questions_cache.values()]
+        self.assertEqual(cached_pools, [[1, 2]])
+
+    def test_returns_none_when_no_question_is_valid(self):
+        self.use_db(_FakeDb(tables={"questions": [_question_row(1, correct=9)]}))
+        with self.assertLogs("src.logic", level="WARNING"):
+            self.assertIsNone(quiz.pick_question(self.TG_ID))
+
+
+if __name__ == "__main__":
+    unittest.main()